@@ -0,0 +1,106 @@
+import numpy as np
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# whisper.audio.SAMPLE_RATE
+SAMPLE_RATE = 16000
+
+# Whisper sizes from fastest to most accurate
+WHISPER_SIZES = ("tiny", "base", "small", "medium", "large")
+
+# Rough seconds of compute per second of speech on one CPU worker; calibrate with WHISPER_REALTIME_FACTORS
+DEFAULT_REALTIME_FACTORS = {"tiny": 0.04, "base": 0.08, "small": 0.25, "medium": 0.7, "large": 1.5}
+
+def size_family(model_size):
+    """'large-v3' -> 'large', 'base.en' -> 'base'; None for sizes not in WHISPER_SIZES."""
+    family = model_size.split(".")[0].split("-")[0]
+    return family if family in WHISPER_SIZES else None
+
+def parse_factors(value):
+    """'tiny:0.04,base:0.08' -> {'tiny': 0.04, 'base': 0.08}, on top of the defaults."""
+    factors = dict(DEFAULT_REALTIME_FACTORS)
+    for item in filter(None, (part.strip() for part in (value or "").split(","))):
+        size, _, factor = item.partition(":")
+        factors[size.strip()] = float(factor)
+    return factors
+
+def voice_segments(audio, frame_seconds=0.03, margin_db=10.0, min_db=-60.0, min_silence_seconds=1.0, padding_seconds=0.25, min_speech_ratio=0.05):
+    """Energy-based voice activity detection. Returns (start, end) sample ranges of speech.
+
+    A frame is voiced when its energy is margin_db above the file's noise floor (its 10th
+    percentile frame) and above min_db. Pauses shorter than min_silence_seconds stay inside a
+    segment, and each segment keeps padding_seconds of context on both sides.
+
+    Steady audio (constant noise, music, a tone) has no floor to stand out from, so when less
+    than min_speech_ratio of the file is kept the whole file is returned instead; Whisper, not
+    this heuristic, decides whether it holds speech."""
+    frame = int(frame_seconds * SAMPLE_RATE)
+    num_frames = len(audio) // frame
+    if num_frames == 0:
+        return [(0, len(audio))] if len(audio) else []
+    energy = np.square(audio[:num_frames * frame]).reshape(num_frames, frame).mean(axis=1)
+    level = 10 * np.log10(energy + 1e-10)
+    voiced = np.flatnonzero(level > max(np.percentile(level, 10) + margin_db, min_db))
+    if len(voiced) < min_speech_ratio * num_frames:
+        logger.info(f"Voice activity detection kept {len(voiced)}/{num_frames} frames, keeping the whole file")
+        return [(0, len(audio))]
+    breaks = np.flatnonzero(np.diff(voiced) > min_silence_seconds / frame_seconds)
+    starts = np.concatenate(([voiced[0]], voiced[breaks + 1]))
+    ends = np.concatenate((voiced[breaks], [voiced[-1]])) + 1
+    pad = int(round(padding_seconds / frame_seconds))
+    starts = np.maximum(starts - pad, 0) * frame
+    ends = np.minimum(ends + pad, num_frames) * frame
+    starts[1:] = np.maximum(starts[1:], ends[:-1])
+    # The tail shorter than one frame belongs to the last segment if it reaches the end
+    if ends[-1] == num_frames * frame:
+        ends[-1] = len(audio)
+    return list(zip(starts.tolist(), ends.tolist()))
+
+def compact(audio, segments):
+    """Concatenate the speech segments into one array."""
+    if not segments:
+        return audio[:0]
+    return np.concatenate([audio[start:end] for start, end in segments])
+
+def to_original(segments, position):
+    """Map a sample position in the compacted audio back to the original file."""
+    if not segments:
+        return position
+    lengths = np.array([end - start for start, end in segments])
+    cumulative = np.cumsum(lengths)
+    index = min(int(np.searchsorted(cumulative, position, side="right")), len(segments) - 1)
+    return segments[index][0] + position - (cumulative[index] - lengths[index])
+
+class TierPolicy:
+    """Picks the most accurate Whisper size, from WHISPER_MIN_MODEL up to the configured
+    model, whose estimated transcription time fits WHISPER_LATENCY_BUDGET_SECONDS."""
+
+    def __init__(self, max_model, min_model=None, budget_seconds=None, factors=None):
+        self.max_model = max_model
+        self.min_model = min_model or os.getenv("WHISPER_MIN_MODEL", "tiny")
+        self.budget_seconds = budget_seconds if budget_seconds is not None else float(os.getenv("WHISPER_LATENCY_BUDGET_SECONDS", "900"))
+        self.factors = factors or parse_factors(os.getenv("WHISPER_REALTIME_FACTORS"))
+
+    def candidates(self):
+        """Sizes to choose from, most accurate first. Just the configured model when tiering is
+        off or the model is not a standard size (a fine-tune or local checkpoint). An
+        English-only model falls back to English-only smaller sizes."""
+        top, bottom = size_family(self.max_model), size_family(self.min_model)
+        if not self.budget_seconds or top is None or bottom is None:
+            return [self.max_model]
+        suffix = ".en" if self.max_model.endswith(".en") else ""
+        high, low = WHISPER_SIZES.index(top), WHISPER_SIZES.index(bottom)
+        return [self.max_model] + [WHISPER_SIZES[i] + suffix for i in range(high - 1, low - 1, -1)]
+
+    def estimate(self, model_size, seconds, workers=1):
+        factor = self.factors.get(model_size, self.factors.get(size_family(model_size) or "", 1.0))
+        return seconds * factor / workers
+
+    def choose(self, speech_seconds, workers=1):
+        candidates = self.candidates()
+        for model_size in candidates:
+            if self.estimate(model_size, speech_seconds, workers) <= self.budget_seconds:
+                return model_size
+        return candidates[-1]
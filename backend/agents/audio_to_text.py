@@ -1,20 +1,194 @@
-import whisper
+import numpy as np
+import subprocess
 import asyncio
 import logging
+import os
+from agents.model_registry import whisper_registry
+from agents.worker_pool import stage_pool
+from agents.job_queue import PermanentJobError
+from agents.audio_preprocessing import SAMPLE_RATE, TierPolicy, voice_segments, compact, to_original
+from agents import metrics
 
 logger = logging.getLogger(__name__)
 
+def load_audio(file_path):
+    """Decode the first audio track of any audio/video file to 16kHz mono float32 (via ffmpeg).
+    Same as whisper.load_audio, without importing whisper and torch into processes that only
+    decode; video, subtitle and data streams are skipped rather than decoded."""
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0", "-i", file_path,
+        "-map", "0:a:0", "-vn", "-sn", "-dn", "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "-"
+    ]
+    try:
+        out = subprocess.run(cmd, capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to load audio: {e.stderr.decode()}") from e
+    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+def load_speech(file_path, trim_silence=True):
+    """Decode and drop silence. Returns (speech audio, speech segments in the original samples,
+    original length in samples)."""
+    audio = load_audio(file_path)
+    segments = voice_segments(audio) if trim_silence else [(0, len(audio))]
+    return compact(audio, segments), segments, len(audio)
+
+def split_audio(audio, chunk_seconds, search_seconds=5.0, frame_seconds=0.02):
+    """Split into windows of about chunk_seconds, returning (start, end) sample indices.
+    Each cut is moved to the quietest frame in the last search_seconds of its window
+    so words are not split between chunks."""
+    chunk = int(chunk_seconds * SAMPLE_RATE)
+    search = int(search_seconds * SAMPLE_RATE)
+    frame = int(frame_seconds * SAMPLE_RATE)
+    bounds = []
+    start = 0
+    while len(audio) - start > chunk:
+        target = start + chunk
+        lo = max(start + frame, target - search)
+        usable = (target - lo) // frame * frame
+        if usable:
+            energy = np.square(audio[lo:lo + usable]).reshape(-1, frame).mean(axis=1)
+            cut = lo + int(np.argmin(energy)) * frame + frame // 2
+        else:
+            cut = target
+        bounds.append((start, cut))
+        start = cut
+    if len(audio) > start:
+        bounds.append((start, len(audio)))
+    return bounds
+
+def transcribe_chunk(model_size, audio, language=None):
+    """Blocking transcription of one audio window, run inside the 'transcribe' stage worker.
+    With a language, Whisper skips its own per-window detection."""
+    with whisper_registry.use(model_size) as whisper_model:
+        return whisper_model.transcribe(audio, language=language)["text"].strip()
+
+def detect_language(model_size, audio):
+    """Blocking language detection on the first 30 seconds; None for stand-ins that can't detect."""
+    with whisper_registry.use(model_size) as whisper_model:
+        if not hasattr(whisper_model, "detect_language"):
+            return None
+        # English-only models (base.en, ...) have no language tokens to detect with
+        if not whisper_model.is_multilingual:
+            return "en"
+        import whisper
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), n_mels=whisper_model.dims.n_mels)
+        _, probs = whisper_model.detect_language(mel.to(whisper_model.device))
+        return max(probs, key=probs.get)
+
+class AudioPlan:
+    """One file's preprocessed speech, chunk bounds and the Whisper model and language chosen for it."""
+
+    def __init__(self, audio, bounds, segments, original_samples, model_size, language, estimated_seconds_saved):
+        self.audio = audio
+        self.bounds = bounds
+        self.segments = segments
+        self.original_samples = original_samples
+        self.model_size = model_size
+        self.language = language
+        self.estimated_seconds_saved = estimated_seconds_saved
+
+    def original_seconds(self, position):
+        """Time in the original file of a sample position in the trimmed audio."""
+        return to_original(self.segments, position) / SAMPLE_RATE
+
+    def fields(self):
+        """Recorded on the files document."""
+        return {
+            "whisper_model": self.model_size,
+            "language": self.language,
+            "audio_seconds": round(self.original_samples / SAMPLE_RATE, 2),
+            "speech_seconds": round(len(self.audio) / SAMPLE_RATE, 2),
+            "estimated_seconds_saved": round(self.estimated_seconds_saved, 2),
+        }
+
 class AudioToTextAgent:
-    async def transcribe(self, file_path, retries=3):
-        whisper_model = whisper.load_model("base")
+    def __init__(self, model_size=None, chunk_seconds=None, inference_client=None):
+        self.model_size = model_size or os.getenv("WHISPER_MODEL", "base")
+        self.chunk_seconds = chunk_seconds or float(os.getenv("AUDIO_CHUNK_SECONDS", "300"))
+        self.inference_client = inference_client
+        # model_size is the most accurate model used; shorter budgets fall back to smaller ones
+        self.tiers = TierPolicy(self.model_size)
+        self.trim_silence = os.getenv("AUDIO_TRIM_SILENCE", "true").lower() == "true"
+        self.language = os.getenv("WHISPER_LANGUAGE") or None
+
+    async def _run_transcription(self, model_size, audio, language=None):
+        if self.inference_client is not None:
+            # The server serializes Whisper itself; the 'inference' stage only bounds in-flight requests
+            return await stage_pool.run("inference", self.inference_client.transcribe, model_size, audio, language)
+        return await stage_pool.run("transcribe", transcribe_chunk, model_size, audio, language)
+
+    async def _detect_language(self, model_size, audio):
+        if self.inference_client is not None:
+            return await stage_pool.run("inference", self.inference_client.detect_language, model_size, audio)
+        return await stage_pool.run("transcribe", detect_language, model_size, audio)
+
+    def _transcribe_workers(self):
+        """Windows transcribed at once. Thread workers share one model per size, and its lock
+        serializes inference, so only a process pool runs them in parallel."""
+        if self.inference_client is not None:
+            return 1
+        kind, workers = stage_pool.config("transcribe")
+        return workers if kind == "process" else 1
+
+    async def plan_chunks(self, file_path):
+        """Decode the file, trim silence, pick the Whisper model, detect the language once and
+        split the speech into chunks."""
+        audio, segments, original_samples = await stage_pool.run("audio_decode", load_speech, file_path, self.trim_silence)
+        if not len(audio):
+            # Retrying cannot make an empty file transcribable
+            raise PermanentJobError(f"No speech detected: {os.path.basename(file_path)} has no audio")
+        workers = self._transcribe_workers()
+        model_size = self.tiers.choose(len(audio) / SAMPLE_RATE, workers)
+        # Against transcribing the untrimmed audio with the configured model
+        saved = (self.tiers.estimate(self.model_size, original_samples / SAMPLE_RATE, workers)
+                 - self.tiers.estimate(model_size, len(audio) / SAMPLE_RATE, workers))
+        language = self.language
+        if language is None and len(audio):
+            language = await self._detect_language(model_size, audio[:30 * SAMPLE_RATE])
+        bounds = split_audio(audio, self.chunk_seconds)
+        metrics.WHISPER_TIER_FILES.labels(model_size).inc()
+        metrics.TRANSCRIPTION_SECONDS_SAVED.inc(max(saved, 0))
+        logger.info(
+            f"Split {file_path} ({original_samples / SAMPLE_RATE:.0f}s, {len(audio) / SAMPLE_RATE:.0f}s of speech) "
+            f"into {len(bounds)} chunks for Whisper '{model_size}' (language {language or 'auto'})"
+        )
+        return AudioPlan(audio, bounds, segments, original_samples, model_size, language, saved)
+
+    async def _transcribe_chunk(self, plan, index, start, end, retries):
         for attempt in range(retries):
             try:
-                logger.info(f"Attempting transcription for {file_path}, attempt {attempt + 1}")
-                result = whisper_model.transcribe(file_path)
-                logger.info(f"Transcription successful for {file_path}")
-                return result["text"]
+                text = await self._run_transcription(plan.model_size, plan.audio[start:end], plan.language)
+                return {"index": index, "start": plan.original_seconds(start), "end": plan.original_seconds(end), "text": text}
             except Exception as e:
-                logger.error(f"Transcription attempt {attempt + 1} failed for {file_path}: {e}")
+                logger.error(f"Transcription of chunk {index} attempt {attempt + 1} failed: {e}")
                 if attempt == retries - 1:
-                    raise Exception("Transcription failed after retries")
-                await asyncio.sleep(2 ** attempt)  # Exponential backoff
\ No newline at end of file
+                    raise Exception(f"Transcription of chunk {index} failed after retries")
+                await asyncio.sleep(2 ** attempt)  # Exponential backoff
+
+    async def transcribe_chunks(self, plan, skip=(), retries=3):
+        """Yield each chunk of the plan as soon as it is transcribed (not necessarily in order).
+        Chunks in `skip` are left out; if any chunk fails, the rest still finish
+        and the first error is raised at the end."""
+        tasks = [
+            asyncio.create_task(self._transcribe_chunk(plan, index, start, end, retries))
+            for index, (start, end) in enumerate(plan.bounds)
+            if index not in skip
+        ]
+        error = None
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    yield await next_done
+                except Exception as e:
+                    error = error or e
+        finally:
+            for task in tasks:
+                task.cancel()
+        if error:
+            raise error
+
+    async def transcribe(self, file_path, retries=3):
+        plan = await self.plan_chunks(file_path)
+        chunks = [chunk async for chunk in self.transcribe_chunks(plan, retries=retries)]
+        logger.info(f"Transcription successful for {file_path}")
+        return " ".join(chunk["text"] for chunk in sorted(chunks, key=lambda c: c["index"]))
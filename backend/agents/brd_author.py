@@ -1,13 +1,90 @@
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
 from datetime import datetime
+from agents.worker_pool import stage_pool
+import hashlib
+import asyncio
 import logging
+import uuid
+import os
 import re
 
 logger = logging.getLogger(__name__)
 
+def content_hash(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def render_pdf(content, pdf_path):
+    """Draw BRD markdown to a PDF. Module-level so it can run in a process-pool stage."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+    logger.info(f"Generating PDF at {pdf_path}")
+    c = canvas.Canvas(pdf_path, pagesize=letter)
+    y = 750
+    
+    # Improved PDF formatting
+    for line in content.split('\n'):
+        if line.startswith('# '):
+            # Main title
+            c.setFont("Helvetica-Bold", 18)
+            c.drawString(72, y, line[2:])
+            y -= 30
+        elif line.startswith('## '):
+            # Section headers
+            if y < 100:  # Check if we need a new page
+                c.showPage()
+                y = 750
+            c.setFont("Helvetica-Bold", 14)
+            c.drawString(72, y, line[3:])
+            y -= 25
+        elif line.startswith('### '):
+            # Subsection headers
+            if y < 100:
+                c.showPage()
+                y = 750
+            c.setFont("Helvetica-Bold", 12)
+            c.drawString(72, y, line[4:])
+            y -= 20
+        elif line.startswith('- '):
+            # Bullet points
+            if y < 100:
+                c.showPage()
+                y = 750
+            c.setFont("Helvetica", 11)
+            c.drawString(90, y, '•')
+            c.drawString(100, y, line[2:])
+            y -= 15
+        elif line.startswith(tuple('0123456789')):
+            # Numbered points
+            if y < 100:
+                c.showPage()
+                y = 750
+            c.setFont("Helvetica", 11)
+            c.drawString(90, y, line)
+            y -= 15
+        elif line.strip():
+            # Regular text
+            if y < 100:
+                c.showPage()
+                y = 750
+            c.setFont("Helvetica", 11)
+            c.drawString(72, y, line)
+            y -= 15
+        else:
+            # Empty line
+            y -= 10
+            
+        if y < 50:
+            c.showPage()
+            y = 750
+            
+    c.save()
+    logger.info(f"PDF generated at {pdf_path}")
+
 class BRDAuthorAgent:
+    def __init__(self, pdf_cache_dir=None):
+        self.pdf_cache_dir = pdf_cache_dir or os.getenv("BRD_PDF_CACHE_DIR", "data/brds/cache")
+        # content hash -> in-flight render, so concurrent downloads of a new BRD render it once
+        self._renders = {}
+
     def _categorize_points(self, points):
         """Categorize key points into different sections based on content analysis"""
         categories = {
@@ -98,66 +175,31 @@ This document requires review and approval from relevant stakeholders before imp
         logger.info("BRD content generated")
         return content
 
-    def generate_pdf(self, content, pdf_path):
-        logger.info(f"Generating PDF at {pdf_path}")
-        c = canvas.Canvas(pdf_path, pagesize=letter)
-        y = 750
-        
-        # Improved PDF formatting
-        for line in content.split('\n'):
-            if line.startswith('# '):
-                # Main title
-                c.setFont("Helvetica-Bold", 18)
-                c.drawString(72, y, line[2:])
-                y -= 30
-            elif line.startswith('## '):
-                # Section headers
-                if y < 100:  # Check if we need a new page
-                    c.showPage()
-                    y = 750
-                c.setFont("Helvetica-Bold", 14)
-                c.drawString(72, y, line[3:])
-                y -= 25
-            elif line.startswith('### '):
-                # Subsection headers
-                if y < 100:
-                    c.showPage()
-                    y = 750
-                c.setFont("Helvetica-Bold", 12)
-                c.drawString(72, y, line[4:])
-                y -= 20
-            elif line.startswith('- '):
-                # Bullet points
-                if y < 100:
-                    c.showPage()
-                    y = 750
-                c.setFont("Helvetica", 11)
-                c.drawString(90, y, '•')
-                c.drawString(100, y, line[2:])
-                y -= 15
-            elif line.startswith(tuple('0123456789')):
-                # Numbered points
-                if y < 100:
-                    c.showPage()
-                    y = 750
-                c.setFont("Helvetica", 11)
-                c.drawString(90, y, line)
-                y -= 15
-            elif line.strip():
-                # Regular text
-                if y < 100:
-                    c.showPage()
-                    y = 750
-                c.setFont("Helvetica", 11)
-                c.drawString(72, y, line)
-                y -= 15
-            else:
-                # Empty line
-                y -= 10
-                
-            if y < 50:
-                c.showPage()
-                y = 750
-                
-        c.save()
-        logger.info(f"PDF generated at {pdf_path}")
\ No newline at end of file
+    def pdf_path(self, digest):
+        return os.path.join(self.pdf_cache_dir, f"{digest}.pdf")
+
+    async def render_pdf(self, content, digest=None):
+        """Return the cached PDF for this content, rendering it in the 'brd_pdf' stage pool
+        on first use. BRDs with identical content share one file."""
+        digest = digest or content_hash(content)
+        pdf_path = self.pdf_path(digest)
+        if os.path.exists(pdf_path):
+            return pdf_path
+        render = self._renders.get(digest)
+        if render is None:
+            render = asyncio.ensure_future(self._render(content, pdf_path))
+            self._renders[digest] = render
+            render.add_done_callback(lambda _: self._renders.pop(digest, None))
+        await asyncio.shield(render)
+        return pdf_path
+
+    async def _render(self, content, pdf_path):
+        os.makedirs(self.pdf_cache_dir, exist_ok=True)
+        # Render to a temporary name so a reader never sees a half-written file
+        tmp_path = f"{pdf_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            await stage_pool.run("brd_pdf", render_pdf, content, tmp_path)
+            os.replace(tmp_path, pdf_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,109 @@
+import numpy as np
+import datetime
+import threading
+import os
+import logging
+from agents.embedding_codec import decode_embedding
+
+logger = logging.getLogger(__name__)
+
+class BRDIndex:
+    """In-memory index of BRD embeddings: one contiguous matrix of L2-normalized float32 rows,
+    so a similarity query is a single matrix-vector product plus a partial sort."""
+
+    def __init__(self, initial_capacity=1024):
+        self._matrix = None
+        self._ids = []
+        self._rows = {}
+        self._size = 0
+        self._capacity = initial_capacity
+        # Newest `created` seen; each sync re-reads from sync_overlap before it, because
+        # BRDs written by other processes (other clocks, buffered writes) can land late
+        self._last_created = None
+        self.sync_overlap = datetime.timedelta(seconds=float(os.getenv("BRD_INDEX_SYNC_OVERLAP_SECONDS", "60")))
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _grow(self, dim, needed):
+        """Reallocate to fit `needed` rows. Caller holds self._lock."""
+        if self._matrix is None:
+            self._matrix = np.zeros((max(self._capacity, needed), dim), dtype=np.float32)
+            return
+        if needed <= self._matrix.shape[0]:
+            return
+        capacity = self._matrix.shape[0]
+        while capacity < needed:
+            capacity *= 2
+        # Readers hold views of the old matrix, so copy rather than resize in place
+        matrix = np.zeros((capacity, dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        self._matrix = matrix
+
+    def add_many(self, brd_ids, embeddings):
+        """Add or replace rows; returns how many BRDs were new to the index."""
+        if not brd_ids:
+            return 0
+        added = 0
+        vectors = self._normalize(embeddings)
+        with self._lock:
+            self._grow(vectors.shape[1], self._size + len(brd_ids))
+            for brd_id, vector in zip(brd_ids, vectors):
+                row = self._rows.get(brd_id)
+                if row is None:
+                    row = self._size
+                    self._rows[brd_id] = row
+                    self._ids.append(brd_id)
+                    self._size += 1
+                    added += 1
+                self._matrix[row] = vector
+        return added
+
+    def add(self, brd_id, embedding):
+        self.add_many([brd_id], [embedding])
+
+    def sync(self, brds_col, batch_size=5000):
+        """Load BRDs inserted since the last sync (by anyone sharing the collection). The overlap
+        window is read again every time; add_many skips BRDs already in the index."""
+        query = {"embedding": {"$exists": True}}
+        if self._last_created is not None:
+            query["created"] = {"$gte": self._last_created - self.sync_overlap}
+        cursor = brds_col.find(query, {"id": 1, "embedding": 1, "created": 1}).sort("created", 1).batch_size(batch_size)
+        ids, embeddings, loaded = [], [], 0
+        for doc in cursor:
+            ids.append(doc["id"])
+            embeddings.append(decode_embedding(doc["embedding"]))
+            if doc.get("created") and (self._last_created is None or doc["created"] > self._last_created):
+                self._last_created = doc["created"]
+            if len(ids) >= batch_size:
+                loaded += self.add_many(ids, embeddings)
+                ids, embeddings = [], []
+        loaded += self.add_many(ids, embeddings)
+        if loaded:
+            logger.info(f"BRD index loaded {loaded} embeddings ({self._size} total)")
+        return loaded
+
+    def search(self, query, k=10, min_score=None):
+        """Return up to k (brd_id, cosine similarity) pairs, best first."""
+        with self._lock:
+            size = self._size
+            matrix = self._matrix[:size] if size else None
+            ids = self._ids[:size]
+        if not size:
+            return []
+        scores = matrix @ self._normalize(query)
+        k = min(k, size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (ids[i], float(scores[i]))
+            for i in top
+            if min_score is None or scores[i] >= min_score
+        ]
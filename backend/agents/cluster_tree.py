@@ -0,0 +1,153 @@
+from bson.binary import Binary
+import numpy as np
+import re
+from agents.embedding_codec import encode_embedding, decode_embedding
+
+def _pack_ints(values):
+    return Binary(np.asarray(values, dtype="<i4").tobytes())
+
+def _unpack_ints(value):
+    return np.frombuffer(value, dtype="<i4")
+
+class ClusterTree:
+    """A document's sentences grouped into leaf clusters, plus a Ward dendrogram over the leaf
+    centroids. Any number of key points is a cut of the dendrogram and any cluster can be
+    expanded into its sub-clusters or sentences, all without re-encoding.
+
+    Node ids follow scipy's linkage convention: leaves are 0..L-1 and row r of the linkage
+    matrix creates node L + r, so the root is 2L - 2.
+    """
+
+    def __init__(self, text, offsets, lengths, members, leaf_sizes, centroids, representatives, linkage):
+        self.text = text
+        self.offsets = np.asarray(offsets)
+        self.lengths = np.asarray(lengths)
+        # Sentence indices grouped by leaf, each leaf ordered closest-to-centroid first
+        self.members = np.asarray(members)
+        self.leaf_sizes = np.asarray(leaf_sizes)
+        self.leaf_starts = np.concatenate(([0], np.cumsum(self.leaf_sizes)[:-1])).astype(np.int64)
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        # Embedding of each leaf's most central sentence
+        self.representatives = np.asarray(representatives, dtype=np.float32)
+        self.linkage = np.asarray(linkage, dtype=np.float64).reshape(-1, 4)
+
+    @property
+    def num_leaves(self):
+        return len(self.leaf_sizes)
+
+    @property
+    def root(self):
+        return 2 * self.num_leaves - 2
+
+    def sentence(self, index):
+        start = int(self.offsets[index])
+        return self.text[start:start + int(self.lengths[index])]
+
+    def leaf_members(self, leaf):
+        start = self.leaf_starts[leaf]
+        return self.members[start:start + self.leaf_sizes[leaf]]
+
+    def leaves(self, node_id):
+        leaves, stack = [], [node_id]
+        while stack:
+            node = stack.pop()
+            if node < self.num_leaves:
+                leaves.append(node)
+            else:
+                row = self.linkage[node - self.num_leaves]
+                stack.extend((int(row[1]), int(row[0])))
+        return leaves
+
+    def children(self, node_id):
+        if node_id < self.num_leaves:
+            return []
+        row = self.linkage[node_id - self.num_leaves]
+        return [int(row[0]), int(row[1])]
+
+    def cut(self, k):
+        """Node ids of the k clusters left after replaying all but the last k - 1 merges."""
+        k = max(1, min(k, self.num_leaves))
+        active = set(range(self.num_leaves))
+        for row in range(self.num_leaves - k):
+            a, b = int(self.linkage[row, 0]), int(self.linkage[row, 1])
+            active.difference_update((a, b))
+            active.add(self.num_leaves + row)
+        return sorted(active)
+
+    def key_point(self, node_id, include_embedding=False):
+        """The cluster's representative: among its leaves' central sentences, the one closest to
+        the size-weighted cluster centroid. Up to 3 other sentences of the cluster, in document
+        order, are listed as similar points."""
+        leaves = self.leaves(node_id)
+        sizes = self.leaf_sizes[leaves].astype(np.float32)
+        centroid = (self.centroids[leaves] * sizes[:, None]).sum(axis=0) / sizes.sum()
+        best = leaves[int(np.argmin(np.linalg.norm(self.representatives[leaves] - centroid, axis=1)))]
+        key_idx = int(self.leaf_members(best)[0])
+        text = re.sub(r'^[-•●\s]+', '', self.sentence(key_idx).strip())
+        # Sentence indices follow document order, so the smallest are the earliest
+        others = np.concatenate([self.leaf_members(leaf) for leaf in leaves])
+        others = others[others != key_idx]
+        earliest = np.sort(np.partition(others, 2)[:3] if len(others) > 3 else others)
+        point = {
+            "text": text,
+            "cluster_id": node_id,
+            "similar_points": [self.sentence(int(i)) for i in earliest],
+            "offset": int(self.offsets[key_idx]),
+            "size": int(sizes.sum()),
+        }
+        if include_embedding:
+            point["embedding"] = encode_embedding(self.representatives[best])
+        return point
+
+    def top_k(self, k, include_embedding=False):
+        """Key points for a k-way cut, in document order. Clusters whose representative is too
+        short to be meaningful are left out, so fewer than k may come back."""
+        points = [self.key_point(node, include_embedding) for node in self.cut(k)]
+        points = [point for point in points if len(point["text"]) > 10]
+        points.sort(key=lambda point: point["offset"])
+        return points
+
+    def node(self, node_id, offset=0, limit=50):
+        """A cluster, its sub-clusters and, for a leaf, a page of its sentences (closest to the centroid first)."""
+        if not 0 <= node_id <= self.root:
+            raise ValueError(f"Cluster {node_id} does not exist; ids run from 0 to {self.root}")
+        result = {
+            "cluster": self.key_point(node_id),
+            "children": [self.key_point(child) for child in self.children(node_id)],
+        }
+        if node_id < self.num_leaves:
+            members = self.leaf_members(node_id)
+            result["sentences"] = [
+                {"text": self.sentence(int(i)), "offset": int(self.offsets[i])}
+                for i in members[offset:offset + limit]
+            ]
+            result["total_sentences"] = len(members)
+        return result
+
+    def to_document(self, transcription_id, file_id):
+        return {
+            "id": transcription_id,
+            "file_id": file_id,
+            "offsets": _pack_ints(self.offsets),
+            "lengths": _pack_ints(self.lengths),
+            "members": _pack_ints(self.members),
+            "leaf_sizes": _pack_ints(self.leaf_sizes),
+            "dim": int(self.centroids.shape[1]),
+            "centroids": encode_embedding(self.centroids.ravel()),
+            "representatives": encode_embedding(self.representatives.ravel()),
+            "linkage": self.linkage.tolist(),
+        }
+
+    @classmethod
+    def from_document(cls, doc, text):
+        dim = doc["dim"]
+        return cls(
+            text,
+            _unpack_ints(doc["offsets"]),
+            _unpack_ints(doc["lengths"]),
+            _unpack_ints(doc["members"]),
+            _unpack_ints(doc["leaf_sizes"]),
+            decode_embedding(doc["centroids"]).reshape(-1, dim),
+            decode_embedding(doc["representatives"]).reshape(-1, dim),
+            doc["linkage"],
+        )
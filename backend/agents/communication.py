@@ -1,7 +1,12 @@
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from pymongo import ReturnDocument
 from dotenv import load_dotenv
+from agents import metrics
+import datetime
+import asyncio
+import uuid
 import os
 import logging
 
@@ -9,35 +14,183 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 
 class CommunicationAgent:
-    def __init__(self):
+    """Queues notifications in the outbox collection; EmailSender delivers them."""
+
+    def __init__(self, kb_agent):
+        self.kb_agent = kb_agent
         # Load email configuration from environment variables
         self.smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
         self.smtp_port = int(os.getenv("SMTP_PORT", "587"))
+        self.smtp_starttls = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
         self.from_email = os.getenv("EMAIL_USER")
         self.to_email = os.getenv("EMAIL_TO")
+        # Optional: a local SMTP stand-in needs neither a password nor STARTTLS
         self.email_password = os.getenv("EMAIL_PASS")
 
-        if not all([self.from_email, self.to_email, self.email_password]):
+        if not all([self.from_email, self.to_email]):
             logger.warning("Email configuration incomplete. Please check environment variables.")
 
+    def configured(self):
+        return all([self.from_email, self.to_email])
+
     async def send_email(self, subject, body):
-        if not all([self.from_email, self.to_email, self.email_password]):
+        """Queue an email; never blocks on SMTP or raises because of it."""
+        if not self.configured():
             logger.error("Email configuration missing. Cannot send email.")
             return
+        now = datetime.datetime.now()
+        with metrics.timed("email_queue"):
+            await self.kb_agent.store_outbox_message({
+                "id": str(uuid.uuid4()),
+                "subject": subject,
+                "body": body,
+                "status": "pending",
+                "attempts": 0,
+                "next_attempt": now,
+                "created": now
+            })
+        logger.info(f"Email '{subject}' queued")
+
+class EmailSender:
+    """Drains the outbox over one reused SMTP session. Messages that pile up between polls are
+    sent as a single digest; failed sends retry with exponential backoff."""
+
+    def __init__(self, comm_agent, poll_interval=None, digest_max=None, max_attempts=None, backoff_seconds=None, idle_seconds=None):
+        self.comm_agent = comm_agent
+        self.outbox_col = comm_agent.kb_agent.outbox_col
+        self.poll_interval = poll_interval or float(os.getenv("EMAIL_POLL_SECONDS", "5"))
+        self.digest_max = digest_max or int(os.getenv("EMAIL_DIGEST_MAX", "50"))
+        self.max_attempts = max_attempts or int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+        self.backoff_seconds = backoff_seconds or int(os.getenv("EMAIL_BACKOFF_SECONDS", "30"))
+        self.idle_seconds = idle_seconds or float(os.getenv("SMTP_IDLE_SECONDS", "60"))
+        self.sender_id = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._smtp = None
+        self._last_used = None
+        self._stopping = asyncio.Event()
+
+    def _claim(self):
+        """Atomically claim up to digest_max due messages. A claim left behind by a crashed
+        sender expires after ten minutes."""
+        now = datetime.datetime.now()
+        messages = []
+        while len(messages) < self.digest_max:
+            message = self.outbox_col.find_one_and_update(
+                {"$or": [
+                    {"status": "pending", "next_attempt": {"$lte": now}},
+                    {"status": "sending", "claimed_at": {"$lt": now - datetime.timedelta(minutes=10)}},
+                ]},
+                {"$set": {"status": "sending", "sender": self.sender_id, "claimed_at": now}, "$inc": {"attempts": 1}},
+                sort=[("next_attempt", 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if message is None:
+                break
+            messages.append(message)
+        return messages
+
+    def _connection(self):
+        agent = self.comm_agent
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except OSError:
+                pass
+            self._close()
+        server = smtplib.SMTP(agent.smtp_server, agent.smtp_port, timeout=30)
+        if agent.smtp_starttls:
+            server.starttls()
+        if agent.email_password:
+            server.login(agent.from_email, agent.email_password)
+        logger.info(f"SMTP session opened to {agent.smtp_server}:{agent.smtp_port}")
+        self._smtp = server
+        return server
+
+    def _close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except OSError:
+                pass
+            self._smtp = None
 
+    @staticmethod
+    def _compose(messages):
+        if len(messages) == 1:
+            return messages[0]["subject"], messages[0]["body"]
+        subject = f"{len(messages)} notifications"
+        body = "\n\n".join(
+            f"[{message['created']:%Y-%m-%d %H:%M:%S}] {message['subject']}\n{message['body']}"
+            for message in messages
+        )
+        return subject, body
+
+    def _send(self, messages):
+        agent = self.comm_agent
+        subject, body = self._compose(messages)
         msg = MIMEMultipart()
-        msg['From'] = self.from_email
-        msg['To'] = self.to_email
+        msg['From'] = agent.from_email
+        msg['To'] = agent.to_email
         msg['Subject'] = subject
         msg.attach(MIMEText(body, 'plain'))
+        with metrics.timed("email_send"):
+            self._connection().sendmail(agent.from_email, agent.to_email, msg.as_string())
+        self._last_used = datetime.datetime.now()
 
-        try:
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.from_email, self.email_password)
-            server.sendmail(self.from_email, self.to_email, msg.as_string())
-            server.quit()
-            logger.info(f"Email sent successfully to {self.to_email}")
-        except Exception as e:
-            logger.error(f"Email sending failed: {e}")
-            raise
\ No newline at end of file
+    def _mark_sent(self, messages):
+        self.outbox_col.update_many(
+            {"id": {"$in": [message["id"] for message in messages]}, "sender": self.sender_id},
+            {"$set": {"status": "sent", "sent_at": datetime.datetime.now(), "error": None}},
+        )
+
+    def _mark_failed(self, messages, error):
+        now = datetime.datetime.now()
+        for message in messages:
+            if message["attempts"] >= self.max_attempts:
+                update = {"status": "failed", "error": error}
+            else:
+                delay = self.backoff_seconds * 2 ** (message["attempts"] - 1)
+                update = {"status": "pending", "next_attempt": now + datetime.timedelta(seconds=delay), "error": error}
+            self.outbox_col.update_one({"id": message["id"], "sender": self.sender_id}, {"$set": update})
+
+    def drain(self):
+        """Send everything currently due; returns the number of messages delivered."""
+        delivered = 0
+        while True:
+            messages = self._claim()
+            if not messages:
+                break
+            try:
+                self._send(messages)
+            except Exception as e:
+                logger.error(f"Email sending failed for {len(messages)} messages: {e}")
+                self._close()
+                self._mark_failed(messages, str(e))
+                break
+            self._mark_sent(messages)
+            delivered += len(messages)
+            logger.info(f"Email sent successfully to {self.comm_agent.to_email} ({len(messages)} messages)")
+        if self._smtp is not None and self._last_used is not None:
+            if (datetime.datetime.now() - self._last_used).total_seconds() > self.idle_seconds:
+                self._close()
+        return delivered
+
+    async def run(self):
+        if not self.comm_agent.configured():
+            logger.warning("Email configuration missing; email sender not started")
+            return
+        logger.info(f"Email sender {self.sender_id} started")
+        while not self._stopping.is_set():
+            try:
+                await self.comm_agent.kb_agent.run(self.drain)
+            except Exception as e:
+                logger.error(f"Email outbox drain failed: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+        await self.comm_agent.kb_agent.run(self._close)
+        logger.info(f"Email sender {self.sender_id} stopped")
+
+    def stop(self):
+        self._stopping.set()
@@ -0,0 +1,174 @@
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import MongoClient, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteError
+from dotenv import load_dotenv
+from agents import metrics
+import threading
+import asyncio
+import time
+import os
+import logging
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+_client = None
+_executor = None
+_lock = threading.Lock()
+
+def get_client():
+    """The process-wide MongoClient. Every agent shares its connection pool."""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = MongoClient(
+                os.getenv("MONGO_URI"),
+                maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+                minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+                maxIdleTimeMS=int(os.getenv("MONGO_MAX_IDLE_MS", "60000")),
+                waitQueueTimeoutMS=int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000")),
+            )
+            logger.info("MongoDB connection established")
+        return _client
+
+def get_database():
+    return get_client()[os.getenv("DATABASE_NAME", "multi_agent_system")]
+
+def get_executor():
+    """Threads that run blocking driver calls for async callers, sized to the connection pool."""
+    global _executor
+    with _lock:
+        if _executor is None:
+            workers = int(os.getenv("MONGO_EXECUTOR_THREADS", os.getenv("MONGO_MAX_POOL_SIZE", "50")))
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mongo")
+        return _executor
+
+async def run(fn, *args, **kwargs):
+    """Run a blocking driver call off the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), lambda: fn(*args, **kwargs))
+
+def _write_error(details):
+    """The exception a single write would have raised, from one entry of writeErrors."""
+    cls = DuplicateKeyError if details.get("code") in (11000, 11001, 12582) else WriteError
+    return cls(details.get("errmsg"), details.get("code"), details)
+
+class WriteCoalescer:
+    """Buffers writes for a short window and sends them as one ordered bulk_write per collection.
+
+    Consecutive $set updates to the same document are merged into a single operation, so a
+    burst of status updates costs one round trip. Callers await the flush that carries
+    their write, so a completed `await` still means the write is in the database, and a
+    failing write raises only for the callers of that write.
+    """
+
+    def __init__(self, window_ms=None, max_batch=None):
+        self.window = (window_ms if window_ms is not None else float(os.getenv("MONGO_WRITE_WINDOW_MS", "20"))) / 1000
+        self.max_batch = max_batch or int(os.getenv("MONGO_WRITE_MAX_BATCH", "500"))
+        self._pending = {}
+        self._flusher = None
+        self._flush_lock = None
+
+    def _enqueue(self, collection, op):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        ops = self._pending.setdefault(collection.name, (collection, []))[1]
+        last = None
+        if op["kind"] == "set":
+            for existing in reversed(ops):
+                if existing["key"] == op["key"]:
+                    last = existing
+                    break
+        if last is not None and last["kind"] == "set":
+            last["fields"].update(op["fields"])
+            last["futures"].append(future)
+        else:
+            op["futures"] = [future]
+            ops.append(op)
+        if len(ops) >= self.max_batch:
+            loop.create_task(self.flush())
+        elif self._flusher is None or self._flusher.done():
+            self._flusher = loop.create_task(self._flush_later())
+        return self._wait(future)
+
+    @staticmethod
+    async def _wait(future):
+        # Charged to the caller's file as 'mongo_write': the window plus the bulk write carrying it
+        with metrics.timed("mongo_write"):
+            await future
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        await self.flush()
+
+    def insert(self, collection, doc):
+        return self._enqueue(collection, {"kind": "insert", "key": (("id", doc.get("id")),), "doc": doc})
+
+    def set_fields(self, collection, filter, fields):
+        key = tuple(sorted(filter.items()))
+        return self._enqueue(collection, {"kind": "set", "key": key, "filter": filter, "fields": dict(fields)})
+
+    def update(self, collection, filter, update):
+        key = tuple(sorted(filter.items()))
+        return self._enqueue(collection, {"kind": "update", "key": key, "filter": filter, "update": update})
+
+    @staticmethod
+    def _to_request(op):
+        if op["kind"] == "insert":
+            return InsertOne(op["doc"])
+        if op["kind"] == "set":
+            return UpdateOne(op["filter"], {"$set": op["fields"]})
+        return UpdateOne(op["filter"], op["update"])
+
+    async def flush(self):
+        # Flushes run one at a time so batches land in the order they were queued
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            await self._flush_pending()
+
+    async def _write_ops(self, collection, ops):
+        """Send ops as ordered bulk writes and return each op's error (None once applied).
+
+        An ordered bulk write stops at its first failing op: the ops before it are applied,
+        that op alone gets the error, and the ops after it were not executed, so they are sent
+        again. Any other failure leaves it unknown what was applied, and fails every op not
+        yet confirmed."""
+        errors = [None] * len(ops)
+        start = 0
+        while start < len(ops):
+            try:
+                await run(collection.bulk_write, [self._to_request(op) for op in ops[start:]], ordered=True)
+                return errors
+            except BulkWriteError as e:
+                write_errors = e.details.get("writeErrors") or []
+                if not write_errors:
+                    # Write concern error: the ops ran but are not confirmed
+                    logger.error(f"Bulk write of {len(ops) - start} operations to {collection.name} failed: {e}")
+                    errors[start:] = [e] * (len(ops) - start)
+                    return errors
+                failed = start + write_errors[0]["index"]
+                logger.error(f"Write to {collection.name} failed: {write_errors[0].get('errmsg')}")
+                errors[failed] = _write_error(write_errors[0])
+                start = failed + 1
+            except Exception as e:
+                logger.error(f"Bulk write of {len(ops) - start} operations to {collection.name} failed: {e}")
+                errors[start:] = [e] * (len(ops) - start)
+                return errors
+        return errors
+
+    async def _flush_pending(self):
+        pending, self._pending = self._pending, {}
+        for collection, ops in pending.values():
+            start = time.perf_counter()
+            errors = await self._write_ops(collection, ops)
+            metrics.MONGO_BULK_WRITE_SECONDS.labels(collection.name).observe(time.perf_counter() - start)
+            metrics.MONGO_BULK_WRITE_OPS.labels(collection.name).inc(len(ops))
+            for op, error in zip(ops, errors):
+                for future in op["futures"]:
+                    if future.done():
+                        continue
+                    if error:
+                        future.set_exception(error)
+                    else:
+                        future.set_result(None)
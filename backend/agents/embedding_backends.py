@@ -0,0 +1,110 @@
+import numpy as np
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# torch: the stock fp32 SentenceTransformer. int8: the same model with its Linear layers
+# dynamically quantized. onnx / onnx-int8: the transformer exported to ONNX and run with
+# ONNX Runtime (optionally int8-quantized); pooling and normalization are done here in NumPy.
+BACKENDS = ("torch", "int8", "onnx", "onnx-int8")
+
+def embedding_backend():
+    backend = os.getenv("EMBEDDING_BACKEND", "torch")
+    if backend not in BACKENDS:
+        raise ValueError(f"EMBEDDING_BACKEND must be one of {', '.join(BACKENDS)}, got '{backend}'")
+    return backend
+
+def cache_model_name(model_name, backend=None):
+    """Embedding-cache key prefix: vectors from different backends differ slightly, so they are cached apart."""
+    backend = backend or embedding_backend()
+    return model_name if backend == "torch" else f"{model_name}:{backend}"
+
+def _hub_id(model_name):
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+class OnnxSentenceEncoder:
+    """ONNX Runtime version of a mean-pooled, L2-normalized sentence-transformers model
+    (all-MiniLM-L6-v2 and friends), with the same encode(texts, batch_size) interface."""
+
+    def __init__(self, model_path, tokenizer, max_seq_length=256, threads=None):
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = tokenizer
+        self.max_seq_length = max_seq_length
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        out = None
+        # Length-sorted batches pad less; rows are written back in input order
+        order = np.argsort([len(text) for text in texts])
+        for start in range(0, len(texts), batch_size):
+            index = order[start:start + batch_size]
+            tokens = self.tokenizer(
+                [texts[i] for i in index], padding=True, truncation=True,
+                max_length=self.max_seq_length, return_tensors="np"
+            )
+            feeds = {name: tokens[name].astype(np.int64) for name in self.input_names if name in tokens}
+            hidden = self.session.run(None, feeds)[0]
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            if out is None:
+                out = np.empty((len(texts), pooled.shape[1]), dtype=np.float32)
+            out[index] = pooled
+        return out
+
+def export_onnx(model_name, path, quantize=False):
+    """Export the model's transformer to ONNX once (needs torch); later loads only need onnxruntime."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0].auto_model.eval()
+    tokens = model.tokenizer(["an example sentence"], return_tensors="pt")
+    names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in tokens]
+    fp32_path = path.replace("-int8.onnx", ".onnx")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if not os.path.exists(fp32_path):
+        logger.info(f"Exporting {model_name} to {fp32_path}")
+        axes = {name: {0: "batch", 1: "sequence"} for name in names}
+        axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+        with torch.no_grad():
+            torch.onnx.export(
+                transformer, tuple(tokens[name] for name in names), fp32_path,
+                input_names=names, output_names=["last_hidden_state"], dynamic_axes=axes, opset_version=14
+            )
+    if quantize and not os.path.exists(path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        logger.info(f"Quantizing {fp32_path} to int8")
+        quantize_dynamic(fp32_path, path, weight_type=QuantType.QInt8)
+    return path
+
+def load_sentence_model(model_name, backend=None):
+    """Build the sentence encoder for `backend` (default EMBEDDING_BACKEND)."""
+    backend = backend or embedding_backend()
+    if backend in ("torch", "int8"):
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(model_name, device="cpu" if backend == "int8" else None)
+        if backend == "int8":
+            import torch
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+    try:
+        import onnxruntime  # noqa: F401
+        from transformers import AutoTokenizer
+    except ImportError:
+        raise ImportError(f"EMBEDDING_BACKEND={backend} needs ONNX Runtime: pip install onnxruntime onnx")
+    onnx_dir = os.getenv("EMBEDDING_ONNX_DIR", "data/models")
+    suffix = "-int8" if backend == "onnx-int8" else ""
+    path = os.path.join(onnx_dir, f"{model_name.replace('/', '__')}{suffix}.onnx")
+    if not os.path.exists(path):
+        export_onnx(model_name, path, quantize=backend == "onnx-int8")
+    threads = int(os.getenv("EMBEDDING_ONNX_THREADS", "0")) or None
+    return OnnxSentenceEncoder(path, AutoTokenizer.from_pretrained(_hub_id(model_name)), threads=threads)
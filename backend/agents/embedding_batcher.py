@@ -0,0 +1,95 @@
+from concurrent.futures import Future
+import numpy as np
+import threading
+import queue
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingBatcher:
+    """Coalesces encode calls from concurrent callers into shared forward passes.
+
+    Requests queue up until the pending batch reaches `max_batch_size` texts or the first
+    request has waited `max_latency_ms`, then run as one model call; each caller gets its
+    own slice of the result. Inputs of a full batch or more gain nothing from coalescing and
+    are encoded on the caller's thread, so they never hold up small requests queued behind
+    them. Safe to call from any thread.
+    """
+
+    def __init__(self, encoder, max_batch_size=64, max_latency_ms=5.0, dim=None):
+        self.encoder = encoder
+        # Width of the (0, dim) array returned for an empty input, as EmbeddingCache does
+        self.dim = dim
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, texts):
+        future = Future()
+        if not texts:
+            future.set_result(np.empty((0, self.dim or 0), dtype=np.float32))
+            return future
+        self._ensure_started()
+        self._queue.put((list(texts), future))
+        return future
+
+    def encode(self, texts):
+        if len(texts) >= self.max_batch_size:
+            return np.asarray(self.encoder(list(texts)))
+        return self.submit(texts).result()
+
+    def _collect(self, first):
+        batch, size = [first], len(first[0])
+        deadline = time.monotonic() + self.max_latency
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            # Callers that cancelled their future are dropped; the rest can no longer be cancelled
+            batch = [item for item in self._collect(first) if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                vectors = np.asarray(self.encoder(texts))
+            except Exception as e:
+                logger.error(f"Batched encode of {len(texts)} texts failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.requests += len(batch)
+            offset = 0
+            for item_texts, future in batch:
+                future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+    def close(self):
+        self._queue.put(None)
@@ -0,0 +1,102 @@
+from collections import OrderedDict
+from pymongo.errors import BulkWriteError
+import numpy as np
+import hashlib
+import threading
+import logging
+from agents.embedding_codec import encode_embedding, decode_embedding
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingCache:
+    """Sentence embeddings keyed by a hash of the model name and whitespace-normalized text.
+    Lookups go through an in-process LRU, then the optional Mongo collection; only the
+    remaining misses are encoded, in a single batch."""
+
+    def __init__(self, encoder, model_name, max_entries=50000, persistent_col=None, dim=None):
+        self.encoder = encoder
+        self.model_name = model_name
+        # Width of the (0, dim) array returned for an empty input; learned from results if not given
+        self.dim = dim
+        self.max_entries = max_entries
+        self.persistent_col = persistent_col
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "persistent_hits": 0, "misses": 0}
+
+    def key(self, text):
+        normalized = " ".join(text.split())
+        return hashlib.sha256(f"{self.model_name}\x00{normalized}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key, embedding):
+        """Caller holds self._lock."""
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def encode(self, texts):
+        """Drop-in for SentenceTransformer.encode: a str gives one vector, a list gives a 2-D array."""
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+        if not texts:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        keys = [self.key(text) for text in texts]
+        found = {}
+        with self._lock:
+            for key in keys:
+                embedding = self._entries.get(key)
+                if embedding is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = embedding
+                    self._stats["hits"] += 1
+
+        # Deduplicate misses so a text repeated in one call is encoded once
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        persistent_hits = 0
+        if missing and self.persistent_col is not None:
+            for doc in self.persistent_col.find({"_id": {"$in": list(missing)}}):
+                found[doc["_id"]] = decode_embedding(doc["embedding"]).astype(np.float32)
+                del missing[doc["_id"]]
+                persistent_hits += 1
+
+        with self._lock:
+            self._stats["persistent_hits"] += persistent_hits
+            self._stats["misses"] += len(missing)
+
+        if missing:
+            encoded = np.asarray(self.encoder(list(missing.values())), dtype=np.float32)
+            new = dict(zip(missing, encoded))
+            found.update(new)
+            if self.persistent_col is not None:
+                self._persist(new)
+
+        with self._lock:
+            for key in keys:
+                self._remember(key, found[key])
+
+        result = np.stack([found[key] for key in keys])
+        self.dim = result.shape[1]
+        return result[0] if single else result
+
+    def _persist(self, embeddings):
+        docs = [{"_id": key, "model": self.model_name, "embedding": encode_embedding(embedding)} for key, embedding in embeddings.items()]
+        try:
+            self.persistent_col.insert_many(docs, ordered=False)
+        except BulkWriteError:
+            # Another worker cached some of the same texts first; the duplicates are harmless
+            pass
+        except Exception as e:
+            logger.warning(f"Persisting {len(docs)} embeddings failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries))
+        lookups = stats["hits"] + stats["persistent_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["persistent_hits"]) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,28 @@
+from bson.binary import Binary
+import numpy as np
+import os
+
+# User-defined BSON binary subtypes, so each stored vector records its own precision
+SUBTYPES = {"float32": 0x80, "float16": 0x81}
+DTYPES = {0x80: np.dtype("<f4"), 0x81: np.dtype("<f2")}
+
+def storage_dtype():
+    dtype = os.getenv("EMBEDDING_STORAGE_DTYPE", "float32")
+    if dtype not in SUBTYPES:
+        raise ValueError(f"EMBEDDING_STORAGE_DTYPE must be one of {', '.join(SUBTYPES)}, got '{dtype}'")
+    return dtype
+
+def encode_embedding(vector, dtype=None):
+    """Pack a vector as little-endian float32/float16 bytes in a BSON Binary."""
+    dtype = dtype or storage_dtype()
+    packed = np.asarray(vector, dtype=np.dtype(dtype).newbyteorder("<"))
+    return Binary(packed.tobytes(), SUBTYPES[dtype])
+
+def decode_embedding(value):
+    """Read a stored embedding as a NumPy array. Packed vectors are viewed in place
+    (read-only, no copy); legacy lists of floats are converted."""
+    if isinstance(value, Binary) and value.subtype in DTYPES:
+        return np.frombuffer(value, dtype=DTYPES[value.subtype])
+    if isinstance(value, (bytes, bytearray)):
+        return np.frombuffer(value, dtype=DTYPES[SUBTYPES["float32"]])
+    return np.asarray(value, dtype=np.float32)
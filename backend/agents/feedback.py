@@ -1,19 +1,13 @@
 import datetime
-from pymongo import MongoClient
-from dotenv import load_dotenv
-import os
 import logging
 
-load_dotenv()
 logger = logging.getLogger(__name__)
 
 class FeedbackAgent:
-    def __init__(self):
-        client = MongoClient(os.getenv("MONGO_URI"))
-        db = client["multi_agent_system"]
-        self.feedback_col = db["feedback"]
+    def __init__(self, kb_agent):
+        self.kb_agent = kb_agent
 
-    def store_feedback(self, brd_id, rating, comments):
+    async def store_feedback(self, brd_id, rating, comments):
         logger.info(f"Storing feedback for BRD {brd_id}")
         feedback_data = {
             "id": str(datetime.datetime.now().timestamp()),
@@ -22,6 +16,6 @@ class FeedbackAgent:
             "comments": comments,
             "timestamp": datetime.datetime.now()
         }
-        self.feedback_col.insert_one(feedback_data)
+        await self.kb_agent.store_feedback(feedback_data)
         logger.info(f"Feedback {feedback_data['id']} stored")
-        return feedback_data
\ No newline at end of file
+        return feedback_data
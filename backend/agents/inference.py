@@ -0,0 +1,209 @@
+from multiprocessing.connection import Listener, Client
+import ipaddress
+import threading
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+class InferenceError(Exception):
+    pass
+
+def _is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host.strip("[]")).is_loopback
+    except ValueError:
+        return False
+
+def parse_address(value):
+    """A multiprocessing.connection address: a filesystem path is a Unix socket, host:port is TCP.
+
+    Connections exchange pickles, so a TCP address must be on the loopback interface; the
+    server is for sharing models between processes on one host."""
+    if ":" in value and not value.startswith("/"):
+        host, port = value.rsplit(":", 1)
+        if not _is_loopback(host):
+            raise ValueError(f"Inference server address must be a Unix socket or a loopback host:port, got '{value}'")
+        return (host.strip("[]"), int(port))
+    return value
+
+def inference_address():
+    """INFERENCE_SERVER_ADDRESS, parsed; None (the default) means models run in-process."""
+    address = os.getenv("INFERENCE_SERVER_ADDRESS")
+    return parse_address(address) if address else None
+
+def inference_authkey():
+    """INFERENCE_AUTHKEY, required: connections are authenticated with it before any pickle is read."""
+    authkey = os.getenv("INFERENCE_AUTHKEY", "")
+    if len(authkey) < 16:
+        raise InferenceError("INFERENCE_AUTHKEY must be set to a secret of at least 16 characters to use the inference server")
+    return authkey.encode()
+
+class InferenceClient:
+    """Talks to an InferenceServer. Thread-safe: each call borrows a pooled connection, so
+    concurrent stage workers don't queue behind each other on one socket."""
+
+    def __init__(self, address, authkey=None, timeout=None):
+        self.address = address
+        self.authkey = authkey or inference_authkey()
+        # Longest wait for one reply; a hung server must not hold a stage thread forever
+        self.timeout = timeout or float(os.getenv("INFERENCE_TIMEOUT_SECONDS", "1800"))
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return Client(self.address, authkey=self.authkey)
+
+    def _release(self, conn):
+        with self._lock:
+            self._idle.append(conn)
+
+    def call(self, op, *args):
+        # One retry on a fresh connection covers pooled sockets left over from a server restart
+        for attempt in range(2):
+            conn = None
+            try:
+                conn = self._acquire()
+                conn.send((op, args))
+                if not conn.poll(self.timeout):
+                    raise InferenceError(f"Inference server at {self.address} did not answer '{op}' within {self.timeout:g}s")
+                status, result = conn.recv()
+            except (OSError, EOFError) as e:
+                if conn is not None:
+                    conn.close()
+                if attempt:
+                    raise InferenceError(f"Inference server at {self.address} unreachable: {e}")
+                continue
+            except BaseException:
+                # The connection may be mid-message; it must not go back to the pool
+                if conn is not None:
+                    conn.close()
+                raise
+            # Only a connection that completed a clean round trip is reused
+            self._release(conn)
+            if status == "error":
+                raise InferenceError(result)
+            return result
+
+    def embed(self, texts):
+        return self.call("embed", list(texts))
+
+    def transcribe(self, model_size, audio, language=None):
+        return self.call("transcribe", model_size, audio, language)
+
+    def detect_language(self, model_size, audio):
+        return self.call("detect_language", model_size, audio)
+
+    def load_embedding_model(self):
+        return self.call("load_embedding_model")
+
+    def load_whisper(self, model_size):
+        return self.call("load_whisper", model_size)
+
+    def status(self):
+        return self.call("status")
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+class InferenceServer:
+    """Holds one copy of the embedding and Whisper models and serves every API/job worker on
+    this host. Embedding requests from all connections go through one cache and micro-batcher,
+    so concurrent callers share forward passes."""
+
+    def __init__(self, address, authkey=None, keypoint_agent=None):
+        # Imported here so clients never load the models through this module
+        from agents.key_point_extraction import KeyPointExtractionAgent
+        self.address = address
+        self.authkey = authkey or inference_authkey()
+        self.keypoint_agent = keypoint_agent or KeyPointExtractionAgent()
+        self._listener = None
+        self._stopping = threading.Event()
+
+    def _handle(self, op, args):
+        from agents.audio_to_text import transcribe_chunk, detect_language
+        from agents.model_registry import whisper_registry
+        if op == "embed":
+            return self.keypoint_agent.encode(*args)
+        if op == "transcribe":
+            return transcribe_chunk(*args)
+        if op == "detect_language":
+            return detect_language(*args)
+        if op == "load_embedding_model":
+            self.keypoint_agent.load_model()
+            return True
+        if op == "load_whisper":
+            whisper_registry.get(*args)
+            return True
+        if op == "status":
+            return {
+                "embedding": self.keypoint_agent.model_loaded(),
+                "whisper": list(whisper_registry.loaded()),
+                "embedding_cache": self.keypoint_agent.embedding_cache.stats(),
+            }
+        raise ValueError(f"Unknown inference op '{op}'")
+
+    def _serve_connection(self, conn):
+        with conn:
+            while not self._stopping.is_set():
+                try:
+                    op, args = conn.recv()
+                except (OSError, EOFError):
+                    return
+                try:
+                    reply = ("ok", self._handle(op, args))
+                except Exception as e:
+                    logger.error(f"Inference op '{op}' failed: {e}")
+                    reply = ("error", str(e))
+                try:
+                    conn.send(reply)
+                except OSError:
+                    return
+
+    def serve_forever(self):
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)  # stale socket from a previous run
+        # Owner-only socket file: other local users cannot even attempt the handshake
+        umask = os.umask(0o177)
+        try:
+            self._listener = Listener(self.address, authkey=self.authkey)
+        finally:
+            os.umask(umask)
+        logger.info(f"Inference server listening on {self.address}")
+        while not self._stopping.is_set():
+            try:
+                conn = self._listener.accept()
+            except Exception as e:
+                if self._stopping.is_set():
+                    break
+                # Failed authentication or a client hanging up mid-handshake affect only that connection
+                logger.error(f"Rejected inference connection: {e}")
+                continue
+            threading.Thread(target=self._serve_connection, args=(conn,), name="inference-conn", daemon=True).start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._listener is not None:
+            self._listener.close()
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_inference_client():
+    """The process-wide client, or None when no inference server is configured."""
+    global _client
+    address = inference_address()
+    if address is None:
+        return None
+    with _client_lock:
+        if _client is None:
+            _client = InferenceClient(address)
+        return _client
@@ -0,0 +1,224 @@
+from pymongo import ReturnDocument, ASCENDING, DESCENDING
+import asyncio
+import datetime
+import socket
+import uuid
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+class PermanentJobError(Exception):
+    """A failure retrying cannot fix, such as unusable input. The job fails on its current attempt."""
+
+class JobQueue:
+    """Durable job queue on a Mongo collection. Workers claim jobs under a lease; an expired
+    lease (crashed worker) makes the job claimable again, and failures retry with backoff."""
+
+    def __init__(self, jobs_col, lease_seconds=None, max_attempts=None, backoff_seconds=None):
+        self.jobs_col = jobs_col
+        self.lease_seconds = lease_seconds or int(os.getenv("JOB_LEASE_SECONDS", "300"))
+        self.max_attempts = max_attempts or int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+        self.backoff_seconds = backoff_seconds or int(os.getenv("JOB_BACKOFF_SECONDS", "10"))
+
+    def ensure_indexes(self):
+        self.jobs_col.create_index([("status", ASCENDING), ("priority", DESCENDING), ("run_at", ASCENDING)])
+        self.jobs_col.create_index([("status", ASCENDING), ("lease_expires", ASCENDING)])
+        self.jobs_col.create_index("id", unique=True)
+
+    def enqueue(self, kind, payload, priority=0):
+        now = datetime.datetime.now()
+        job = {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "payload": payload,
+            "priority": priority,
+            "status": "queued",
+            "attempts": 0,
+            "run_at": now,
+            "lease_expires": None,
+            "worker": None,
+            "error": None,
+            "created": now,
+        }
+        self.jobs_col.insert_one(job)
+        logger.info(f"Enqueued {kind} job {job['id']} with priority {priority}")
+        return job["id"]
+
+    def claim(self, worker_id):
+        now = datetime.datetime.now()
+        return self.jobs_col.find_one_and_update(
+            {"$or": [
+                {"status": "queued", "run_at": {"$lte": now}},
+                # A crashed worker's job is retried only while it has attempts left; see reap_abandoned
+                {"status": "running", "lease_expires": {"$lt": now}, "attempts": {"$lt": self.max_attempts}},
+            ]},
+            {
+                "$set": {
+                    "status": "running",
+                    "worker": worker_id,
+                    "lease_expires": now + datetime.timedelta(seconds=self.lease_seconds),
+                    "started": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("priority", DESCENDING), ("run_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def reap_abandoned(self):
+        """Fail jobs whose worker died (lease expired) on their final attempt, so they are not
+        reclaimed forever. Returns the failed jobs."""
+        abandoned = []
+        while True:
+            now = datetime.datetime.now()
+            job = self.jobs_col.find_one_and_update(
+                {"status": "running", "lease_expires": {"$lt": now}, "attempts": {"$gte": self.max_attempts}},
+                {"$set": {
+                    "status": "failed",
+                    "lease_expires": None,
+                    "finished": now,
+                    "error": "Worker stopped responding on the final attempt",
+                }},
+                return_document=ReturnDocument.AFTER,
+            )
+            if job is None:
+                return abandoned
+            logger.error(f"Job {job['id']} failed permanently: its worker was lost after {job['attempts']} attempts")
+            abandoned.append(job)
+
+    def renew(self, job, worker_id):
+        """Extend the lease; returns False if another worker has taken the job over."""
+        result = self.jobs_col.update_one(
+            {"id": job["id"], "worker": worker_id, "status": "running"},
+            {"$set": {"lease_expires": datetime.datetime.now() + datetime.timedelta(seconds=self.lease_seconds)}},
+        )
+        return result.modified_count == 1
+
+    def complete(self, job, worker_id):
+        self.jobs_col.update_one(
+            {"id": job["id"], "worker": worker_id},
+            {"$set": {"status": "done", "lease_expires": None, "finished": datetime.datetime.now(), "error": None}},
+        )
+
+    def fail(self, job, worker_id, error, final=False):
+        if final or job["attempts"] >= self.max_attempts:
+            update = {"status": "failed", "lease_expires": None, "finished": datetime.datetime.now(), "error": error}
+            logger.error(f"Job {job['id']} failed permanently after {job['attempts']} attempts: {error}")
+        else:
+            delay = self.backoff_seconds * 2 ** (job["attempts"] - 1)
+            update = {
+                "status": "queued",
+                "lease_expires": None,
+                "run_at": datetime.datetime.now() + datetime.timedelta(seconds=delay),
+                "error": error,
+            }
+            logger.warning(f"Job {job['id']} attempt {job['attempts']} failed, retrying in {delay}s: {error}")
+        self.jobs_col.update_one({"id": job["id"], "worker": worker_id}, {"$set": update})
+
+    def is_final_attempt(self, job):
+        return job["attempts"] >= self.max_attempts
+
+    def depth(self):
+        return self.jobs_col.count_documents({"status": {"$in": ["queued", "running"]}})
+
+class JobWorker:
+    """Drains a JobQueue, running up to `concurrency` jobs at once. Any number of these can
+    run against the same collection, in one process or across hosts."""
+
+    def __init__(self, queue, handlers, concurrency=None, poll_interval=None, failure_handlers=None):
+        self.queue = queue
+        self.handlers = handlers
+        # kind -> async fn(job), for jobs failed by reap_abandoned (their own handler is gone)
+        self.failure_handlers = failure_handlers or {}
+        self.concurrency = concurrency or int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))
+        self.poll_interval = poll_interval or float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stopping = asyncio.Event()
+        self._running = set()
+
+    async def _keep_lease(self, job, work):
+        """Renew the lease until cancelled. Renewal errors are retried sooner; if another worker
+        has taken the job over, `work` is cancelled so the job is not processed twice."""
+        interval = self.queue.lease_seconds / 3
+        delay = interval
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                renewed = await asyncio.to_thread(self.queue.renew, job, self.worker_id)
+            except Exception as e:
+                delay = min(interval, 5)
+                logger.warning(f"Renewing lease on job {job['id']} failed, retrying in {delay}s: {e}")
+                continue
+            if not renewed:
+                logger.warning(f"Lost lease on job {job['id']}, stopping its handler")
+                work.cancel()
+                return
+            delay = interval
+
+    async def _run(self, job):
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            await asyncio.to_thread(self.queue.fail, job, self.worker_id, f"No handler for job kind '{job['kind']}'")
+            return
+        work = asyncio.create_task(handler(job))
+        heartbeat = asyncio.create_task(self._keep_lease(job, work))
+        try:
+            await work
+            await asyncio.to_thread(self.queue.complete, job, self.worker_id)
+            logger.info(f"Job {job['id']} completed")
+        except asyncio.CancelledError:
+            if not heartbeat.done():
+                raise
+            # The heartbeat cancelled the handler: the job now belongs to another worker
+            logger.warning(f"Job {job['id']} abandoned after losing its lease")
+        except PermanentJobError as e:
+            await asyncio.to_thread(self.queue.fail, job, self.worker_id, str(e), final=True)
+        except Exception as e:
+            await asyncio.to_thread(self.queue.fail, job, self.worker_id, str(e))
+        finally:
+            heartbeat.cancel()
+
+    async def _reap_abandoned(self):
+        try:
+            abandoned = await asyncio.to_thread(self.queue.reap_abandoned)
+        except Exception as e:
+            logger.error(f"Reaping abandoned jobs failed: {e}")
+            return
+        for job in abandoned:
+            on_failure = self.failure_handlers.get(job["kind"])
+            if on_failure is None:
+                continue
+            try:
+                await on_failure(job)
+            except Exception as e:
+                logger.error(f"Failure handler for job {job['id']} raised: {e}")
+
+    async def run(self):
+        logger.info(f"Job worker {self.worker_id} started with concurrency {self.concurrency}")
+        slots = asyncio.Semaphore(self.concurrency)
+        while not self._stopping.is_set():
+            await slots.acquire()
+            await self._reap_abandoned()
+            try:
+                job = await asyncio.to_thread(self.queue.claim, self.worker_id)
+            except Exception as e:
+                logger.error(f"Claiming job failed: {e}")
+                job = None
+            if job is None:
+                slots.release()
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            logger.info(f"Worker {self.worker_id} claimed job {job['id']} (attempt {job['attempts']})")
+            task = asyncio.create_task(self._run(job))
+            self._running.add(task)
+            task.add_done_callback(lambda t: (self._running.discard(t), slots.release()))
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        logger.info(f"Job worker {self.worker_id} stopped")
+
+    def stop(self):
+        self._stopping.set()
@@ -1,78 +1,175 @@
-from sentence_transformers import SentenceTransformer
-from sklearn.cluster import KMeans
 import numpy as np
+import threading
+import time
 import re
+import os
 import logging
+from agents import metrics
+from agents.embedding_cache import EmbeddingCache
+from agents.embedding_batcher import EmbeddingBatcher
+from agents.embedding_codec import encode_embedding
+from agents.cluster_tree import ClusterTree
+from agents.embedding_backends import embedding_backend, cache_model_name, load_sentence_model
 
 logger = logging.getLogger(__name__)
 
+MODEL_NAME = 'all-MiniLM-L6-v2'
+EMBEDDING_DIM = 384
+
 class KeyPointExtractionAgent:
-    def __init__(self):
-        self.sentence_model = SentenceTransformer('all-MiniLM-L6-v2')
-        logger.info("SentenceTransformer model loaded")
+    def __init__(self, cache_col=None, sentence_model=None, inference_client=None, backend=None):
+        # Loaded on first use (or by load_model() during warm-up), not at construction
+        self._sentence_model = sentence_model
+        self._model_lock = threading.Lock()
+        # With an inference server the model lives there; this process keeps only the caches
+        self.inference_client = inference_client
+        self._remote_model_loaded = False
+        self.backend = backend or embedding_backend()
+        self.large_input_threshold = int(os.getenv("KEYPOINT_LARGE_INPUT_THRESHOLD", "5000"))
+        # Sentences are first grouped into this many leaf clusters; the hierarchy is built over them
+        self.leaf_clusters = int(os.getenv("KEYPOINT_LEAF_CLUSTERS", "64"))
+        self.batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+        self.embedding_batcher = EmbeddingBatcher(
+            self._encode_batch,
+            max_batch_size=self.batch_size,
+            max_latency_ms=float(os.getenv("EMBEDDING_BATCH_LATENCY_MS", "5")),
+            dim=EMBEDDING_DIM
+        )
+        self.embedding_cache = EmbeddingCache(
+            self.embedding_batcher.encode,
+            cache_model_name(MODEL_NAME, self.backend),
+            max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "50000")),
+            persistent_col=cache_col,
+            dim=EMBEDDING_DIM
+        )
 
-    def preprocess_text(self, text):
-        # Split on common section markers
-        sections = re.split(r'\d+\.|•|\n\n|\r\n\r\n', text)
-        # Clean up sections
-        sections = [s.strip() for s in sections if s.strip()]
-        # Further split long sections into sentences
+    @property
+    def sentence_model(self):
+        if self._sentence_model is None:
+            self.load_model()
+        return self._sentence_model
+
+    def _encode_batch(self, texts):
+        if self.inference_client is not None:
+            return self.inference_client.embed(texts)
+        return self.sentence_model.encode(texts, batch_size=self.batch_size)
+
+    def load_model(self):
+        if self.inference_client is not None:
+            self._remote_model_loaded = self.inference_client.load_embedding_model()
+            return None
+        with self._model_lock:
+            if self._sentence_model is None:
+                start = time.perf_counter()
+                self._sentence_model = load_sentence_model(MODEL_NAME, self.backend)
+                metrics.MODEL_LOAD_SECONDS.labels(cache_model_name(MODEL_NAME, self.backend)).set(time.perf_counter() - start)
+                logger.info(f"Sentence model loaded ({self.backend} backend)")
+        return self._sentence_model
+
+    def model_loaded(self):
+        if self.inference_client is not None:
+            return self._remote_model_loaded
+        return self._sentence_model is not None
+
+    def encode(self, texts):
+        """Encode through the embedding cache; uncached texts are micro-batched with other callers'."""
+        return self.embedding_cache.encode(texts)
+
+    @staticmethod
+    def _split_with_offsets(text, pattern, base=0):
+        """re.split that keeps the start offset of each stripped, non-empty piece."""
+        pieces = []
+        start = 0
+        bounds = [(m.start(), m.end()) for m in re.finditer(pattern, text)] + [(len(text), len(text))]
+        for end, next_start in bounds:
+            piece = text[start:end]
+            stripped = piece.strip()
+            if stripped:
+                pieces.append((stripped, base + start + len(piece) - len(piece.lstrip())))
+            start = next_start
+        return pieces
+
+    def preprocess_text_with_offsets(self, text):
+        """Same chunks as preprocess_text, each paired with its character offset in `text`."""
         sentences = []
-        for section in sections:
-            # Split on period followed by space or newline
-            section_sentences = re.split(r'(?<=[.!?])\s+', section)
-            sentences.extend([s.strip() for s in section_sentences if s.strip()])
+        # Split on common section markers, then split sections on period followed by space or newline
+        for section, offset in self._split_with_offsets(text, r'\d+\.|•|\n\n|\r\n\r\n'):
+            sentences.extend(self._split_with_offsets(section, r'(?<=[.!?])\s+', base=offset))
         return sentences
 
-    def extract_key_points(self, transcription):
+    def preprocess_text(self, text):
+        return [sentence for sentence, _ in self.preprocess_text_with_offsets(text)]
+
+    def _cluster(self, embeddings, num_clusters):
+        from sklearn.cluster import KMeans, MiniBatchKMeans
+        if len(embeddings) >= self.large_input_threshold:
+            # Mini-batch updates keep memory and time roughly linear for multi-hour transcripts
+            logger.info(f"Clustering {len(embeddings)} sentences with MiniBatchKMeans")
+            model = MiniBatchKMeans(n_clusters=num_clusters, random_state=42, batch_size=2048, n_init=3)
+        else:
+            model = KMeans(n_clusters=num_clusters, random_state=42)
+        model.fit(embeddings)
+        return model
+
+    def _linkage(self, centroids):
+        from scipy.cluster.hierarchy import linkage
+        if len(centroids) < 2:
+            return np.empty((0, 4))
+        return linkage(centroids, method="ward")
+
+    def build_cluster_tree(self, text, chunks, embeddings):
+        """Cluster sentences into at most `leaf_clusters` leaves, then build a Ward dendrogram
+        over the leaf centroids so key points can be cut at any granularity later."""
+        offsets = np.array([offset for _, offset in chunks], dtype=np.int64)
+        lengths = np.array([len(sentence) for sentence, _ in chunks], dtype=np.int64)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        num_leaves = min(len(chunks), self.leaf_clusters)
+        if num_leaves == len(chunks):
+            # Short documents: every sentence is its own leaf
+            labels, centroids = np.arange(num_leaves), embeddings
+        else:
+            with metrics.timed("kmeans"):
+                kmeans = self._cluster(embeddings, num_leaves)
+            labels, centroids = kmeans.labels_, kmeans.cluster_centers_
+        
+        # Group members by label, closest to their own centroid first, with one stable sort
+        own_distance = np.linalg.norm(embeddings - centroids[labels], axis=1)
+        members = np.lexsort((own_distance, labels))
+        counts = np.bincount(labels, minlength=num_leaves)
+        # MiniBatchKMeans can leave a cluster empty; drop it from the tree
+        kept = np.flatnonzero(counts)
+        centroids = np.asarray(centroids, dtype=np.float32)[kept]
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[kept]
+        representatives = embeddings[members[starts]]
+        
+        with metrics.timed("linkage"):
+            linkage = self._linkage(centroids)
+        return ClusterTree(text, offsets, lengths, members, counts[kept], centroids, representatives, linkage)
+
+    def extract_key_points_with_tree(self, transcription):
+        """Key points for the default cluster count, plus the tree they were cut from (None for
+        transcriptions too short to cluster)."""
         logger.info("Extracting key points from transcription")
         
         # Preprocess text into meaningful chunks
-        sentences = self.preprocess_text(transcription)
+        chunks = self.preprocess_text_with_offsets(transcription)
         
-        if len(sentences) < 2:
+        if len(chunks) < 2:
             logger.info("Transcription too short, returning single key point")
-            return [{"text": transcription, "cluster_id": 0, "embedding": self.sentence_model.encode([transcription])[0].tolist()}]
+            return [{"text": transcription, "cluster_id": 0, "embedding": encode_embedding(self.encode([transcription])[0])}], None
         
         # Generate embeddings for all sentences
-        embeddings = self.sentence_model.encode(sentences)
+        with metrics.timed("sentence_embedding"):
+            embeddings = self.encode([sentence for sentence, _ in chunks])
         
-        # Determine number of clusters based on content length
-        num_clusters = min(max(3, len(sentences) // 3), 15)  # At least 3, at most 15 clusters
+        tree = self.build_cluster_tree(transcription, chunks, embeddings)
         
-        # Cluster similar sentences
-        kmeans = KMeans(n_clusters=num_clusters, random_state=42)
-        kmeans.fit(embeddings)
-        
-        # Extract key points from each cluster
-        key_points = []
-        for i in range(num_clusters):
-            cluster_indices = [j for j, label in enumerate(kmeans.labels_) if label == i]
-            if cluster_indices:
-                # Get all sentences in this cluster
-                cluster_sentences = [sentences[idx] for idx in cluster_indices]
-                cluster_embeddings = embeddings[cluster_indices]
-                
-                # Find the most representative sentence (closest to centroid)
-                centroid = kmeans.cluster_centers_[i]
-                distances = [np.linalg.norm(emb - centroid) for emb in cluster_embeddings]
-                key_idx = cluster_indices[np.argmin(distances)]
-                
-                # Clean up the key point text
-                key_point_text = sentences[key_idx].strip()
-                # Remove redundant markers
-                key_point_text = re.sub(r'^[-•●\s]+', '', key_point_text)
-                
-                if len(key_point_text) > 10:  # Only add if the key point is meaningful
-                    key_points.append({
-                        "text": key_point_text,
-                        "cluster_id": i,
-                        "embedding": embeddings[key_idx].tolist(),
-                        "similar_points": [s for s in cluster_sentences if s != key_point_text][:3]  # Store up to 3 similar points
-                    })
-        
-        # Sort key points by their position in the original text
-        key_points.sort(key=lambda x: transcription.find(x["text"]))
+        # Determine number of clusters based on content length
+        num_clusters = min(max(3, len(chunks) // 3), 15)  # At least 3, at most 15 clusters
+        key_points = tree.top_k(num_clusters, include_embedding=True)
         
         logger.info(f"Extracted {len(key_points)} key points")
-        return key_points
\ No newline at end of file
+        return key_points, tree
+
+    def extract_key_points(self, transcription):
+        return self.extract_key_points_with_tree(transcription)[0]
@@ -1,41 +1,193 @@
-from pymongo import MongoClient
-from dotenv import load_dotenv
-import os
+from agents.database import get_database, run, WriteCoalescer
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
 import logging
 
-load_dotenv()
 logger = logging.getLogger(__name__)
 
+# collection -> [(keys, options)]; created and verified at startup by ensure_indexes
+INDEXES = {
+    "files": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("content_hash", ASCENDING), ("status", ASCENDING)], {}),
+    ],
+    "transcriptions": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("file_id", ASCENDING)], {}),
+    ],
+    "brds": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("transcription_id", ASCENDING)], {}),
+        ([("created", ASCENDING)], {}),
+    ],
+    "tickets": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("brd_id", ASCENDING), ("status", ASCENDING)], {}),
+    ],
+    "feedback": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("brd_id", ASCENDING)], {}),
+    ],
+    "outbox": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("status", ASCENDING), ("next_attempt", ASCENDING)], {}),
+    ],
+    "cluster_trees": [
+        ([("id", ASCENDING)], {"unique": True}),
+        ([("file_id", ASCENDING)], {}),
+    ],
+}
+
+# The UI only needs text; embeddings stay in the database unless a caller asks for them
+TRANSCRIPTION_PROJECTION = {"key_points.embedding": 0, "chunks.key_points.embedding": 0}
+BRD_PROJECTION = {"embedding": 0}
+
 class KnowledgeBaseAgent:
+    """Async access to the Mongo collections. Driver calls run on the shared pool's executor;
+    inserts and field updates are coalesced into short-window bulk writes."""
+
     def __init__(self):
-        client = MongoClient(os.getenv("MONGO_URI"))
-        db = client["multi_agent_system"]
+        db = get_database()
         self.files_col = db["files"]
         self.transcriptions_col = db["transcriptions"]
         self.brds_col = db["brds"]
         self.tickets_col = db["tickets"]
-        logger.info("MongoDB connection established")
+        self.feedback_col = db["feedback"]
+        self.jobs_col = db["jobs"]
+        self.embedding_cache_col = db["embedding_cache"]
+        self.outbox_col = db["outbox"]
+        self.cluster_trees_col = db["cluster_trees"]
+        self.db = db
+        self.writes = WriteCoalescer()
+
+    def ensure_indexes(self):
+        """Create the declared indexes and check they exist; returns the ones that are missing."""
+        missing = []
+        for name, indexes in INDEXES.items():
+            collection = self.db[name]
+            for keys, options in indexes:
+                try:
+                    collection.create_index(keys, **options)
+                except OperationFailure as e:
+                    logger.error(f"Creating index {keys} on {name} failed: {e}")
+            existing = [index["key"] for index in collection.index_information().values()]
+            for keys, _ in indexes:
+                if list(keys) not in existing:
+                    missing.append((name, keys))
+                    logger.error(f"Index {keys} on {name} is missing; lookups on it will scan the collection")
+        if not missing:
+            logger.info("All declared MongoDB indexes are present")
+        return missing
+
+    async def run(self, fn, *args, **kwargs):
+        """Run any blocking driver call (or helper that makes them) off the event loop."""
+        return await run(fn, *args, **kwargs)
 
-    def store_file(self, file_data):
+    async def flush(self):
+        await self.writes.flush()
+
+    async def store_file(self, file_data):
         logger.info(f"Storing file {file_data['id']}")
-        self.files_col.insert_one(file_data)
+        await self.writes.insert(self.files_col, file_data)
 
-    def update_file(self, file_id, update_data):
+    async def update_file(self, file_id, update_data):
         logger.info(f"Updating file {file_id}")
-        self.files_col.update_one({"id": file_id}, {"$set": update_data})
+        await self.writes.set_fields(self.files_col, {"id": file_id}, update_data)
 
-    def get_file(self, file_id):
+    async def get_file(self, file_id, projection=None):
         logger.info(f"Retrieving file {file_id}")
-        return self.files_col.find_one({"id": file_id})
+        return await run(self.files_col.find_one, {"id": file_id}, projection)
 
-    def store_transcription(self, transcription_data):
+    async def store_transcription(self, transcription_data):
         logger.info(f"Storing transcription {transcription_data['id']}")
-        self.transcriptions_col.insert_one(transcription_data)
+        await self.writes.insert(self.transcriptions_col, transcription_data)
+
+    async def get_transcription(self, file_id, projection=None):
+        logger.info(f"Retrieving transcription for file {file_id}")
+        transcription = await run(self.transcriptions_col.find_one, {"file_id": file_id}, projection)
+        if transcription is None:
+            # Duplicate uploads link to the transcription of the first identical file
+            file_data = await run(self.files_col.find_one, {"id": file_id}, {"duplicate_of": 1})
+            if file_data and file_data.get("duplicate_of"):
+                transcription = await run(self.transcriptions_col.find_one, {"file_id": file_data["duplicate_of"]}, projection)
+        return transcription
+
+    async def delete_transcriptions(self, file_id):
+        logger.info(f"Deleting transcriptions for file {file_id}")
+        await self.flush()
+        await run(self.transcriptions_col.delete_many, {"file_id": file_id})
+        await run(self.cluster_trees_col.delete_many, {"file_id": file_id})
+
+    async def find_processed_file(self, content_hash, exclude_id=None):
+        logger.info(f"Looking up processed file with hash {content_hash}")
+        query = {"content_hash": content_hash, "status": "done", "duplicate_of": None}
+        if exclude_id:
+            query["id"] = {"$ne": exclude_id}
+        return await run(self.files_col.find_one, query, {"id": 1})
+
+    async def update_transcription(self, transcription_id, update_data):
+        logger.info(f"Updating transcription {transcription_id}")
+        await self.writes.set_fields(self.transcriptions_col, {"id": transcription_id}, update_data)
 
-    def store_brd(self, brd_data):
+    async def append_transcription_chunk(self, transcription_id, chunk):
+        logger.info(f"Appending chunk {chunk['index']} to transcription {transcription_id}")
+        await self.writes.update(self.transcriptions_col, {"id": transcription_id}, {"$push": {"chunks": chunk}})
+
+    async def store_cluster_tree(self, tree_data):
+        """Keyed by transcription id; a rebuilt tree replaces the old one."""
+        logger.info(f"Storing cluster tree for transcription {tree_data['id']}")
+        await run(self.cluster_trees_col.replace_one, {"id": tree_data["id"]}, tree_data, upsert=True)
+
+    async def get_cluster_tree(self, transcription_id):
+        logger.info(f"Retrieving cluster tree for transcription {transcription_id}")
+        return await run(self.cluster_trees_col.find_one, {"id": transcription_id})
+
+    async def store_brd(self, brd_data):
         logger.info(f"Storing BRD {brd_data['id']}")
-        self.brds_col.insert_one(brd_data)
+        await self.writes.insert(self.brds_col, brd_data)
 
-    def store_ticket(self, ticket_data):
+    async def get_brd(self, brd_id, projection=BRD_PROJECTION):
+        logger.info(f"Retrieving BRD {brd_id}")
+        return await run(self.brds_col.find_one, {"id": brd_id}, projection)
+
+    async def store_ticket(self, ticket_data):
         logger.info(f"Storing ticket {ticket_data['id']}")
-        self.tickets_col.insert_one(ticket_data)
\ No newline at end of file
+        await self.writes.insert(self.tickets_col, ticket_data)
+
+    @staticmethod
+    def _keyset_query(filters, after):
+        query = dict(filters)
+        if after is not None:
+            query["_id"] = {"$gt": after}
+        return query
+
+    async def get_tickets(self, filters=None, after=None, limit=100):
+        """One page of tickets in _id order, starting after the `after` ObjectId."""
+        logger.info(f"Retrieving tickets {filters or {}} after {after}")
+        query = self._keyset_query(filters or {}, after)
+        return await run(lambda: list(self.tickets_col.find(query).sort("_id", 1).limit(limit)))
+
+    def iter_tickets(self, filters=None, after=None, limit=None):
+        """Blocking iterator straight over the Mongo cursor, for streaming responses."""
+        logger.info(f"Streaming tickets {filters or {}} after {after}")
+        cursor = self.tickets_col.find(self._keyset_query(filters or {}, after)).sort("_id", 1)
+        return cursor.limit(limit) if limit else cursor
+
+    def iter_ranked_brds(self, matches, filters=None, batch_size=100, projection=BRD_PROJECTION):
+        """Blocking iterator over BRDs for ranked (brd_id, score) matches, in rank order with a
+        score field, fetching batch_size documents at a time."""
+        for start in range(0, len(matches), batch_size):
+            batch = matches[start:start + batch_size]
+            query = dict(filters or {}, id={"$in": [brd_id for brd_id, _ in batch]})
+            brds = {brd["id"]: brd for brd in self.brds_col.find(query, projection)}
+            for brd_id, score in batch:
+                if brd_id in brds:
+                    yield dict(brds[brd_id], score=score)
+
+    async def store_outbox_message(self, message):
+        logger.info(f"Queueing email {message['id']}")
+        await self.writes.insert(self.outbox_col, message)
+
+    async def store_feedback(self, feedback_data):
+        logger.info(f"Storing feedback {feedback_data['id']}")
+        await self.writes.insert(self.feedback_col, feedback_data)
@@ -0,0 +1,78 @@
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+import contextvars
+import contextlib
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages run from sub-second (embedding a query) to tens of minutes (Whisper on long audio)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+STAGE_SECONDS = Histogram("pipeline_stage_seconds", "Time spent running a pipeline stage", ["stage"], buckets=STAGE_BUCKETS)
+STAGE_WAIT_SECONDS = Histogram("pipeline_stage_wait_seconds", "Time a stage call waited for a free worker", ["stage"], buckets=STAGE_BUCKETS)
+STAGE_FAILURES = Counter("pipeline_stage_failures_total", "Pipeline stage calls that raised", ["stage"])
+FILES_PROCESSED = Counter("files_processed_total", "Files that finished processing", ["status"])
+MONGO_BULK_WRITE_SECONDS = Histogram("mongo_bulk_write_seconds", "Duration of coalesced bulk writes", ["collection"])
+MONGO_BULK_WRITE_OPS = Counter("mongo_bulk_write_operations_total", "Operations sent in coalesced bulk writes", ["collection"])
+HTTP_REQUEST_SECONDS = Histogram("http_request_seconds", "API request latency", ["method", "route", "status"])
+MODEL_LOAD_SECONDS = Gauge("model_load_seconds", "Duration of the most recent load of each model", ["model"])
+JOB_QUEUE_DEPTH = Gauge("job_queue_depth", "Jobs queued or running")
+OUTBOX_PENDING = Gauge("email_outbox_pending", "Emails waiting to be sent")
+EMBEDDING_CACHE = Gauge("embedding_cache", "Embedding cache counters (hits, persistent_hits, misses, size, hit_rate)", ["stat"])
+WHISPER_TIER_FILES = Counter("whisper_tier_files_total", "Audio files by the Whisper model chosen for them", ["model"])
+TRANSCRIPTION_SECONDS_SAVED = Counter("transcription_estimated_seconds_saved_total", "Estimated Whisper time saved by silence trimming and model tiering")
+WHISPER_MODEL_BYTES = Gauge("whisper_model_bytes", "Memory held by each loaded Whisper model", ["size"])
+
+# Per-file stage totals; set by track_file() and copied into thread-pool stages by StagePool
+_file_timings = contextvars.ContextVar("file_timings", default=None)
+_timings_lock = threading.Lock()
+
+def record(stage, seconds, failed=False):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    if failed:
+        STAGE_FAILURES.labels(stage).inc()
+    timings = _file_timings.get()
+    if timings is not None:
+        with _timings_lock:
+            timings[stage] = round(timings.get(stage, 0.0) + seconds, 3)
+
+@contextlib.contextmanager
+def timed(stage):
+    """Time the block as `stage`, in the histogram and in the current file's totals."""
+    start = time.perf_counter()
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        record(stage, time.perf_counter() - start, failed)
+
+@contextlib.contextmanager
+def track_file():
+    """Collect {stage: seconds} for everything timed while processing one file."""
+    timings = {}
+    token = _file_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _file_timings.reset(token)
+
+def update_runtime_gauges(reasoning_agent):
+    """Refresh gauges that are read from live state rather than updated as events happen."""
+    from agents.model_registry import whisper_registry
+    kb_agent = reasoning_agent.kb_agent
+    try:
+        JOB_QUEUE_DEPTH.set(reasoning_agent.job_queue.depth())
+        OUTBOX_PENDING.set(kb_agent.outbox_col.count_documents({"status": {"$in": ["pending", "sending"]}}))
+    except Exception as e:
+        logger.error(f"Reading queue depth for metrics failed: {e}")
+    for stat, value in reasoning_agent.keypoint_agent.embedding_cache.stats().items():
+        EMBEDDING_CACHE.labels(stat).set(value)
+    WHISPER_MODEL_BYTES.clear()
+    for size, nbytes in whisper_registry.loaded().items():
+        WHISPER_MODEL_BYTES.labels(size).set(nbytes)
+
+def render():
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,135 @@
+from agents import metrics
+import threading
+import contextlib
+import time
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+class WhisperModelRegistry:
+    """Process-wide cache of Whisper models, loaded once per size and shared by every transcription."""
+
+    def __init__(self, memory_budget_mb=None, idle_ttl=None):
+        budget_mb = memory_budget_mb if memory_budget_mb is not None else int(os.getenv("WHISPER_MEMORY_BUDGET_MB", "4096"))
+        self.memory_budget = budget_mb * 1024 * 1024
+        self.idle_ttl = idle_ttl if idle_ttl is not None else float(os.getenv("WHISPER_IDLE_TTL", "1800"))
+        self._models = {}
+        self._load_locks = {}
+        self._lock = threading.Lock()
+        self._sweeper = None
+
+    def _estimate_bytes(self, model):
+        if not hasattr(model, "parameters"):
+            return 0
+        return sum(p.numel() * p.element_size() for p in model.parameters())
+
+    def _load(self, size):
+        with self._lock:
+            load_lock = self._load_locks.setdefault(size, threading.Lock())
+        # Only one thread loads a given size; the others wait and reuse its result
+        with load_lock:
+            with self._lock:
+                entry = self._models.get(size)
+            if entry:
+                return entry
+            logger.info(f"Loading Whisper model '{size}'")
+            start = time.perf_counter()
+            # Imported here so processes that never transcribe don't pay for torch
+            import whisper
+            model = whisper.load_model(size)
+            entry = {
+                "model": model,
+                "bytes": self._estimate_bytes(model),
+                "last_used": time.monotonic(),
+                # Whisper installs kv-cache hooks on the model while decoding, so inference must be serialized
+                "lock": threading.Lock(),
+            }
+            load_seconds = time.perf_counter() - start
+            metrics.MODEL_LOAD_SECONDS.labels(f"whisper-{size}").set(load_seconds)
+            logger.info(f"Whisper model '{size}' loaded in {load_seconds:.2f}s ({entry['bytes'] / 1e6:.0f}MB)")
+            with self._lock:
+                self._models[size] = entry
+                self._evict(keep=size)
+                self._start_sweeper()
+            return entry
+
+    def _start_sweeper(self):
+        """Idle models must be dropped even when nothing else is loaded or requested, so a
+        daemon thread re-runs eviction periodically once the first model is in. Caller holds self._lock."""
+        if self._sweeper is not None or self.idle_ttl <= 0:
+            return
+        interval = max(1.0, min(60.0, self.idle_ttl / 2))
+        def _sweep():
+            while True:
+                time.sleep(interval)
+                with self._lock:
+                    self._evict()
+        self._sweeper = threading.Thread(target=_sweep, name="whisper-evict", daemon=True)
+        self._sweeper.start()
+
+    def _evict(self, keep=None):
+        """Drop idle models and, if over budget, least recently used ones. Caller holds self._lock."""
+        now = time.monotonic()
+        for size, entry in list(self._models.items()):
+            if size != keep and not entry["lock"].locked() and now - entry["last_used"] > self.idle_ttl:
+                logger.info(f"Evicting idle Whisper model '{size}'")
+                del self._models[size]
+        candidates = sorted(
+            (s for s, e in self._models.items() if s != keep and not e["lock"].locked()),
+            key=lambda s: self._models[s]["last_used"]
+        )
+        while candidates and self.total_bytes() > self.memory_budget:
+            size = candidates.pop(0)
+            logger.info(f"Evicting Whisper model '{size}' to stay within memory budget")
+            del self._models[size]
+
+    def register(self, size, model):
+        """Serve an already-built model (e.g. a local checkpoint or an offline stand-in) as `size`."""
+        entry = {"model": model, "bytes": self._estimate_bytes(model), "last_used": time.monotonic(), "lock": threading.Lock()}
+        with self._lock:
+            self._models[size] = entry
+            self._evict(keep=size)
+            self._start_sweeper()
+
+    def total_bytes(self):
+        return sum(entry["bytes"] for entry in self._models.values())
+
+    def get(self, size):
+        with self._lock:
+            entry = self._models.get(size)
+            if entry:
+                entry["last_used"] = time.monotonic()
+                self._evict(keep=size)
+                return entry["model"]
+        return self._load(size)["model"]
+
+    @contextlib.contextmanager
+    def use(self, size):
+        """Yield the shared model for `size`, holding its inference lock for the duration."""
+        with self._lock:
+            entry = self._models.get(size)
+        if not entry:
+            entry = self._load(size)
+        with entry["lock"]:
+            entry["last_used"] = time.monotonic()
+            yield entry["model"]
+            entry["last_used"] = time.monotonic()
+
+    def warm(self, sizes):
+        """Load the given model sizes in a background thread so the first request skips the load."""
+        def _warm():
+            for size in sizes:
+                try:
+                    self.get(size)
+                except Exception as e:
+                    logger.error(f"Warm-up of Whisper model '{size}' failed: {e}")
+        thread = threading.Thread(target=_warm, name="whisper-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def loaded(self):
+        with self._lock:
+            return {size: entry["bytes"] for size, entry in self._models.items()}
+
+whisper_registry = WhisperModelRegistry()
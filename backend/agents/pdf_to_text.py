@@ -0,0 +1,64 @@
+import PyPDF2
+import asyncio
+import logging
+import os
+from agents.worker_pool import stage_pool
+
+logger = logging.getLogger(__name__)
+
+def count_pdf_pages(file_path):
+    with open(file_path, 'rb') as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+def extract_pdf_pages(file_path, start, end):
+    """Blocking extraction of pages [start, end), run inside the 'pdf' stage worker.
+    Returns (texts, failures) where failures is a list of {"page", "error"} (1-based pages)."""
+    texts, failures = [], []
+    with open(file_path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        for number in range(start, end):
+            try:
+                texts.append(reader.pages[number].extract_text() or "")
+            except Exception as e:
+                failures.append({"page": number + 1, "error": str(e)})
+    return texts, failures
+
+class PDFToTextAgent:
+    def __init__(self, pages_per_task=None):
+        self.pages_per_task = pages_per_task or int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+
+    async def plan_ranges(self, file_path):
+        """Return [(start, end), ...] page ranges, one per worker task."""
+        num_pages = await stage_pool.run("pdf", count_pdf_pages, file_path)
+        ranges = [(start, min(start + self.pages_per_task, num_pages)) for start in range(0, num_pages, self.pages_per_task)]
+        logger.info(f"Split {file_path} ({num_pages} pages) into {len(ranges)} ranges")
+        return ranges
+
+    async def _extract_range(self, index, file_path, start, end):
+        texts, failures = await stage_pool.run("pdf", extract_pdf_pages, file_path, start, end)
+        for failure in failures:
+            logger.warning(f"Page {failure['page']} of {file_path} failed: {failure['error']}")
+        return {"index": index, "pages": [start + 1, end], "text": " ".join(texts).strip(), "failed_pages": failures}
+
+    async def extract_ranges(self, file_path, ranges, skip=()):
+        """Yield each page range as soon as it is extracted (not necessarily in order).
+        Pages that fail are listed on their range instead of failing the document."""
+        tasks = [
+            asyncio.create_task(self._extract_range(index, file_path, start, end))
+            for index, (start, end) in enumerate(ranges)
+            if index not in skip
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def extract_text(self, file_path):
+        logger.info(f"Extracting text from PDF {file_path}")
+        ranges = await self.plan_ranges(file_path)
+        chunks = [chunk async for chunk in self.extract_ranges(file_path, ranges)]
+        text = " ".join(chunk["text"] for chunk in sorted(chunks, key=lambda c: c["index"]) if chunk["text"])
+        logger.info(f"Extracted {len(text)} characters from {file_path}")
+        return text
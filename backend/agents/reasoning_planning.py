@@ -0,0 +1,305 @@
+import datetime
+from collections import OrderedDict
+import logging
+import os
+import numpy as np
+
+from agents.audio_to_text import AudioToTextAgent
+from agents.pdf_to_text import PDFToTextAgent
+from agents.key_point_extraction import KeyPointExtractionAgent
+from agents.knowledge_base import KnowledgeBaseAgent
+from agents.brd_author import BRDAuthorAgent
+from agents.task_management import TaskManagementAgent
+from agents.quality_check import QualityCheckAgent
+from agents.communication import CommunicationAgent, EmailSender
+from agents.feedback import FeedbackAgent
+from agents.job_queue import JobQueue, JobWorker, PermanentJobError
+from agents.brd_index import BRDIndex
+from agents.embedding_codec import decode_embedding
+from agents.cluster_tree import ClusterTree
+from agents.worker_pool import stage_pool
+from agents.model_registry import whisper_registry
+from agents.inference import get_inference_client
+from agents import metrics
+
+class ReasoningPlanningAgent:
+    def __init__(self):
+        # None unless INFERENCE_SERVER_ADDRESS is set; then models are served by inference_server.py
+        self.inference_client = get_inference_client()
+        self.audio_agent = AudioToTextAgent(inference_client=self.inference_client)
+        self.pdf_agent = PDFToTextAgent()
+        self.kb_agent = KnowledgeBaseAgent()
+        persist_embeddings = os.getenv("EMBEDDING_CACHE_PERSIST", "false").lower() == "true"
+        self.keypoint_agent = KeyPointExtractionAgent(
+            cache_col=self.kb_agent.embedding_cache_col if persist_embeddings else None,
+            inference_client=self.inference_client
+        )
+        self.brd_agent = BRDAuthorAgent()
+        self.task_agent = TaskManagementAgent()
+        self.quality_agent = QualityCheckAgent()
+        self.comm_agent = CommunicationAgent(self.kb_agent)
+        self.feedback_agent = FeedbackAgent(self.kb_agent)
+        self.job_queue = JobQueue(self.kb_agent.jobs_col)
+        self.brd_index = BRDIndex()
+        # Decoded cluster trees of recently browsed transcriptions, most recent last
+        self._cluster_trees = OrderedDict()
+        self.cluster_tree_cache_size = int(os.getenv("CLUSTER_TREE_CACHE_SIZE", "32"))
+        self.logger = logging.getLogger(__name__)
+        # Nothing above touches Mongo or loads a model; prepare() and warm_models() do, and
+        # capabilities() reports how far they have got
+        self._database_ready = False
+        self._remote_whisper_loaded = False
+        self._warmup_errors = {}
+
+    def prepare(self):
+        """Blocking: create indexes and load the BRD index. Safe to call more than once."""
+        if self._database_ready:
+            return
+        self.kb_agent.ensure_indexes()
+        self.job_queue.ensure_indexes()
+        self.brd_index.sync(self.kb_agent.brds_col)
+        self._database_ready = True
+        self.logger.info("Database prepared")
+
+    def warm_models(self):
+        """Blocking: load the embedding and Whisper models so first requests skip the load."""
+        for name, load in (
+            ("embedding", self.keypoint_agent.load_model),
+            ("transcription", self._load_whisper),
+        ):
+            try:
+                load()
+                self._warmup_errors.pop(name, None)
+            except Exception as e:
+                self._warmup_errors[name] = str(e)
+                self.logger.error(f"Warm-up of the {name} model failed: {str(e)}")
+
+    def _load_whisper(self):
+        if self.inference_client is not None:
+            self._remote_whisper_loaded = self.inference_client.load_whisper(self.audio_agent.model_size)
+        else:
+            whisper_registry.get(self.audio_agent.model_size)
+
+    def capabilities(self):
+        if self.inference_client is not None:
+            transcription = self._remote_whisper_loaded
+        else:
+            transcription = self.audio_agent.model_size in whisper_registry.loaded()
+        return {
+            "database": self._database_ready,
+            "embedding": self.keypoint_agent.model_loaded(),
+            "transcription": transcription,
+            "errors": dict(self._warmup_errors),
+        }
+
+    def create_email_sender(self):
+        return EmailSender(self.comm_agent)
+
+    def create_worker(self, concurrency=None):
+        return JobWorker(
+            self.job_queue,
+            {"process_file": self.handle_process_file_job},
+            concurrency=concurrency,
+            failure_handlers={"process_file": self.handle_abandoned_file_job}
+        )
+
+    async def enqueue_file(self, file_id, file_path, content_type, priority=0):
+        await self.kb_agent.update_file(file_id, {"status": "queued"})
+        return await self.kb_agent.run(
+            self.job_queue.enqueue,
+            "process_file",
+            {"file_id": file_id, "file_path": file_path, "content_type": content_type},
+            priority=priority,
+        )
+
+    async def link_duplicate(self, file_id, content_hash):
+        """If identical content was already processed, point this file at that transcription."""
+        if not content_hash:
+            return False
+        original = await self.kb_agent.find_processed_file(content_hash, exclude_id=file_id)
+        if not original:
+            return False
+        await self.kb_agent.delete_transcriptions(file_id)
+        await self.kb_agent.update_file(file_id, {"status": "done", "duplicate_of": original["id"], "error": None})
+        self.logger.info(f"File {file_id} has the same content as {original['id']}, skipping processing")
+        return True
+
+    async def handle_process_file_job(self, job):
+        payload = job["payload"]
+        # An identical upload may have finished while this job waited in the queue
+        file_data = await self.kb_agent.get_file(payload["file_id"], {"content_hash": 1})
+        if file_data and await self.link_duplicate(payload["file_id"], file_data.get("content_hash")):
+            return
+        await self.process_file(
+            payload["file_id"], payload["file_path"], payload["content_type"],
+            final_attempt=self.job_queue.is_final_attempt(job)
+        )
+
+    async def handle_abandoned_file_job(self, job):
+        """The worker processing this file died on its final attempt; record the failure on the file."""
+        file_id = job["payload"]["file_id"]
+        await self.kb_agent.update_file(file_id, {"status": "error", "error": job["error"]})
+        metrics.FILES_PROCESSED.labels("error").inc()
+
+    async def _start_transcription(self, file_id):
+        """Return the file's partial transcription document, creating it on the first attempt."""
+        transcription = await self.kb_agent.get_transcription(file_id, {"id": 1, "status": 1, "chunks": 1})
+        if transcription and transcription.get("status") == "partial":
+            return transcription
+        if transcription:
+            await self.kb_agent.delete_transcriptions(file_id)
+        transcription = {
+            "id": str(datetime.datetime.now().timestamp()),
+            "file_id": file_id,
+            "status": "partial",
+            "text": "",
+            "key_points": [],
+            "chunks": [],
+            "timestamp": datetime.datetime.now()
+        }
+        await self.kb_agent.store_transcription(transcription)
+        return transcription
+
+    async def _store_chunk(self, transcription_id, chunk):
+        if chunk["text"]:
+            chunk["key_points"] = await stage_pool.run("key_points", self.keypoint_agent.extract_key_points, chunk["text"])
+        else:
+            chunk["key_points"] = []
+        await self.kb_agent.append_transcription_chunk(transcription_id, chunk)
+
+    @staticmethod
+    def _join_chunks(chunks):
+        return " ".join(chunks[index]["text"] for index in sorted(chunks) if chunks[index]["text"])
+
+    async def _transcribe_audio(self, file_id, transcription, file_path):
+        """Transcribe chunk by chunk, storing each chunk's text and key points as it finishes.
+        Chunks already stored by an earlier attempt are not redone."""
+        plan = await self.audio_agent.plan_chunks(file_path)
+        chunks = {chunk["index"]: chunk for chunk in transcription.get("chunks", [])}
+        if chunks:
+            self.logger.info(f"Resuming file {file_id} with {len(chunks)}/{len(plan.bounds)} chunks already transcribed")
+        await self.kb_agent.update_file(file_id, {"chunks_total": len(plan.bounds), "chunks_done": len(chunks), **plan.fields()})
+        async for chunk in self.audio_agent.transcribe_chunks(plan, skip=set(chunks)):
+            await self._store_chunk(transcription["id"], chunk)
+            chunks[chunk["index"]] = chunk
+            await self.kb_agent.update_file(file_id, {"chunks_done": len(chunks)})
+        return self._join_chunks(chunks)
+
+    async def _extract_pdf(self, file_id, transcription, file_path):
+        """Extract page ranges in parallel, storing each range's text and key points as it
+        finishes. Failed pages are recorded on the file instead of failing the document."""
+        ranges = await self.pdf_agent.plan_ranges(file_path)
+        chunks = {chunk["index"]: chunk for chunk in transcription.get("chunks", [])}
+        failed_pages = [failure for chunk in chunks.values() for failure in chunk.get("failed_pages", [])]
+        pages_done = sum(chunk["pages"][1] - chunk["pages"][0] + 1 for chunk in chunks.values())
+        await self.kb_agent.update_file(file_id, {
+            "pages_total": ranges[-1][1] if ranges else 0,
+            "pages_done": pages_done,
+            "failed_pages": failed_pages
+        })
+        async for chunk in self.pdf_agent.extract_ranges(file_path, ranges, skip=set(chunks)):
+            await self._store_chunk(transcription["id"], chunk)
+            chunks[chunk["index"]] = chunk
+            pages_done += chunk["pages"][1] - chunk["pages"][0] + 1
+            failed_pages.extend(chunk["failed_pages"])
+            await self.kb_agent.update_file(file_id, {"pages_done": pages_done, "failed_pages": failed_pages})
+        return self._join_chunks(chunks)
+
+    @staticmethod
+    def _timing_fields(timings, started):
+        """Per-stage seconds for the latest attempt. Stages overlap (chunks run in parallel, and
+        key_points includes sentence_embedding, kmeans and linkage), so they need not sum to the total."""
+        return {
+            "stage_seconds": dict(timings),
+            "processing_seconds": round((datetime.datetime.now() - started).total_seconds(), 3)
+        }
+
+    async def process_file(self, file_id, file_path, content_type, final_attempt=True):
+        started = datetime.datetime.now()
+        with metrics.track_file() as timings:
+            try:
+                self.logger.info(f"Processing file {file_id}")
+                await self.kb_agent.update_file(file_id, {"status": "transcribing"})
+                transcription_data = await self._start_transcription(file_id)
+                if content_type.startswith("video/") or content_type.startswith("audio/"):
+                    transcription = await self._transcribe_audio(file_id, transcription_data, file_path)
+                elif content_type == "application/pdf":
+                    transcription = await self._extract_pdf(file_id, transcription_data, file_path)
+                else:
+                    raise ValueError("Unsupported file type")
+                if not transcription:
+                    # Whisper heard no words (or the PDF has no text); another attempt would hear the same
+                    raise PermanentJobError("Transcription failed: no text found")
+                key_points, tree = await stage_pool.run("key_points", self.keypoint_agent.extract_key_points_with_tree, transcription)
+                if tree is not None:
+                    await self.kb_agent.store_cluster_tree(tree.to_document(transcription_data["id"], file_id))
+                self._cluster_trees.pop(transcription_data["id"], None)
+                await self.kb_agent.update_transcription(transcription_data["id"], {
+                    "status": "done",
+                    "text": transcription,
+                    "key_points": key_points,
+                    "timestamp": datetime.datetime.now()
+                })
+                await self.comm_agent.send_email("Transcription Completed", f"File {file_id} processed.")
+                await self.kb_agent.update_file(file_id, {"status": "done", "error": None, **self._timing_fields(timings, started)})
+                metrics.FILES_PROCESSED.labels("done").inc()
+                self.logger.info(f"File {file_id} processed successfully")
+            except Exception as e:
+                self.logger.error(f"File {file_id} processing failed: {str(e)}")
+                if not final_attempt and not isinstance(e, PermanentJobError):
+                    await self.kb_agent.update_file(file_id, {"status": "retrying", "error": str(e), **self._timing_fields(timings, started)})
+                    raise
+                await self.comm_agent.send_email("Processing Failed", f"File {file_id} failed: {str(e)}")
+                await self.kb_agent.update_file(file_id, {"status": "error", "error": str(e), **self._timing_fields(timings, started)})
+                metrics.FILES_PROCESSED.labels("error").inc()
+                raise
+
+    async def get_cluster_tree(self, file_id):
+        """The file's key-point cluster tree, or None if it has no finished transcription or is
+        too short to cluster. Trees missing for transcriptions processed before they were stored
+        are built once and saved."""
+        transcription = await self.kb_agent.get_transcription(file_id, {"id": 1, "file_id": 1, "status": 1, "text": 1})
+        if not transcription or transcription.get("status") != "done":
+            return None
+        transcription_id = transcription["id"]
+        if transcription_id in self._cluster_trees:
+            self._cluster_trees.move_to_end(transcription_id)
+            return self._cluster_trees[transcription_id]
+        doc = await self.kb_agent.get_cluster_tree(transcription_id)
+        if doc is not None:
+            tree = ClusterTree.from_document(doc, transcription["text"])
+        else:
+            self.logger.info(f"Building cluster tree for transcription {transcription_id}")
+            _, tree = await stage_pool.run("key_points", self.keypoint_agent.extract_key_points_with_tree, transcription["text"])
+            if tree is None:
+                return None
+            await self.kb_agent.store_cluster_tree(tree.to_document(transcription_id, transcription["file_id"]))
+        self._cluster_trees[transcription_id] = tree
+        while len(self._cluster_trees) > self.cluster_tree_cache_size:
+            self._cluster_trees.popitem(last=False)
+        return tree
+
+    async def suggest_brd(self, key_points):
+        embeddings = [decode_embedding(kp["embedding"]) for kp in key_points]
+        avg_embedding = np.mean(embeddings, axis=0, dtype=np.float32)
+        await self.kb_agent.run(self.brd_index.sync, self.kb_agent.brds_col)
+        matches = self.brd_index.search(avg_embedding, k=1, min_score=0.85)
+        if matches:
+            brd_id, similarity = matches[0]
+            self.logger.info(f"Suggested BRD {brd_id} with similarity {similarity}")
+            return True, brd_id
+        return False, None
+
+    async def rank_brds(self, key_points, k=None, min_score=None):
+        """(brd_id, score) pairs ranked by cosine similarity to the mean embedding of the given
+        key point texts; all BRDs when k is None."""
+        embeddings = await stage_pool.run("embedding", self.keypoint_agent.encode, key_points)
+        await self.kb_agent.run(self.brd_index.sync, self.kb_agent.brds_col)
+        return self.brd_index.search(np.mean(embeddings, axis=0), k=k or len(self.brd_index), min_score=min_score)
+
+    async def find_similar_brds(self, key_points, k=10, offset=0, filters=None, min_score=None):
+        """BRD documents for ranks [offset, offset + k), each with its similarity score."""
+        # One extra match tells whether there is a next page
+        matches = await self.rank_brds(key_points, k=offset + k + 1, min_score=min_score)
+        page = matches[offset:offset + k]
+        return await self.kb_agent.run(lambda: list(self.kb_agent.iter_ranked_brds(page, filters))), len(matches) > offset + k
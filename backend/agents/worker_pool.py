@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from agents import metrics
+import multiprocessing
+import contextvars
+import functools
+import asyncio
+import time
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# stage -> (executor kind, max concurrent jobs); override with STAGE_<NAME>_EXECUTOR / STAGE_<NAME>_WORKERS
+STAGE_DEFAULTS = {
+    "audio_decode": ("thread", 2),
+    "transcribe": ("thread", 1),
+    "pdf": ("process", os.cpu_count() or 1),
+    "key_points": ("thread", 2),
+    "embedding": ("thread", 4),
+    "brd_pdf": ("process", 2),
+    "inference": ("thread", 8),
+}
+
+def _timed_call(fn, submitted, *args, **kwargs):
+    """Runs in the worker: returns (seconds waited for a worker, seconds running, result).
+    Wall-clock time so the wait is comparable across processes."""
+    started = time.time()
+    result = fn(*args, **kwargs)
+    return started - submitted, time.time() - started, result
+
+class StagePool:
+    """Runs CPU-heavy pipeline stages off the event loop, one bounded executor per stage."""
+
+    def __init__(self, defaults=None):
+        self.defaults = defaults or STAGE_DEFAULTS
+        self._executors = {}
+
+    def config(self, stage):
+        kind, workers = self.defaults.get(stage, ("thread", 1))
+        kind = os.getenv(f"STAGE_{stage.upper()}_EXECUTOR", kind)
+        workers = int(os.getenv(f"STAGE_{stage.upper()}_WORKERS", workers))
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind '{kind}' for stage {stage}")
+        return kind, max(1, workers)
+
+    def executor(self, stage):
+        executor = self._executors.get(stage)
+        if executor is None:
+            kind, workers = self.config(stage)
+            if kind == "process":
+                # spawn rather than fork: forking a process that holds torch/OpenMP threads can deadlock
+                executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"stage-{stage}")
+            logger.info(f"Started {kind} pool for stage '{stage}' with {workers} workers")
+            self._executors[stage] = executor
+        return executor
+
+    async def run(self, stage, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) in the stage's executor. Process stages need a picklable module-level fn."""
+        loop = asyncio.get_running_loop()
+        call = functools.partial(_timed_call, fn, time.time(), *args, **kwargs)
+        if self.config(stage)[0] == "thread":
+            # Lets timings recorded inside the stage (e.g. KMeans within key_points) reach the caller's file
+            call = functools.partial(contextvars.copy_context().run, call)
+        start = time.perf_counter()
+        try:
+            waited, elapsed, result = await loop.run_in_executor(self.executor(stage), call)
+        except Exception:
+            metrics.record(stage, time.perf_counter() - start, failed=True)
+            raise
+        metrics.STAGE_WAIT_SECONDS.labels(stage).observe(max(waited, 0.0))
+        metrics.record(stage, elapsed)
+        return result
+
+    def shutdown(self, wait=True):
+        for stage, executor in self._executors.items():
+            logger.info(f"Shutting down pool for stage '{stage}'")
+            executor.shutdown(wait=wait, cancel_futures=True)
+        self._executors.clear()
+
+stage_pool = StagePool()
@@ -0,0 +1,15 @@
+"""
+Offline benchmarks for the agent pipeline. Run from the backend directory, e.g. `python -m benchmarks.bench_key_points`.
+
+`python -m benchmarks.bench_pipeline` times every stage and the full pipeline on synthetic
+audio, PDF and transcript fixtures, fully offline (stub models, mongomock, no SMTP), and
+compares against benchmarks/results/baseline.json; `--save-baseline` records a new one.
+
+`python -m benchmarks.load_test` drives the HTTP API with a weighted request mix and reports
+p50/p95/p99 latency, throughput and server RSS over time. Without --url it starts server.py on
+mongomock with stub models and a stub SMTP sink; pass several --users values to step up load,
+and a long --step-seconds for a soak test.
+
+`python -m benchmarks.bench_embedding_backends` measures throughput of each EMBEDDING_BACKEND and
+its agreement with fp32 (cosine, nearest neighbours, selected key points); needs the local model.
+"""
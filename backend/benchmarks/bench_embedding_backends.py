@@ -0,0 +1,79 @@
+import argparse
+import statistics
+import time
+import numpy as np
+
+from agents.embedding_backends import BACKENDS, load_sentence_model
+from agents.key_point_extraction import KeyPointExtractionAgent, MODEL_NAME
+from benchmarks.fixtures import synthetic_transcript
+
+def load_corpus(path, size):
+    if path:
+        with open(path) as f:
+            return f.read()
+    return synthetic_transcript(size)
+
+def throughput(model, sentences, batch_size, repeat):
+    model.encode(sentences[:batch_size], batch_size=batch_size)  # warm-up: first call allocates and JITs
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model.encode(sentences, batch_size=batch_size)
+        times.append(time.perf_counter() - start)
+    return len(sentences) / statistics.median(times)
+
+def accuracy(reference, candidate):
+    """Per-sentence cosine to the fp32 vectors, and how often each sentence's nearest neighbour is unchanged."""
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    cosine = np.sum(reference * candidate, axis=1)
+    ref_sim, cand_sim = reference @ reference.T, candidate @ candidate.T
+    np.fill_diagonal(ref_sim, -np.inf)
+    np.fill_diagonal(cand_sim, -np.inf)
+    neighbours = np.mean(ref_sim.argmax(axis=1) == cand_sim.argmax(axis=1))
+    return float(cosine.mean()), float(cosine.min()), float(neighbours)
+
+def key_point_overlap(reference_points, points):
+    """Jaccard overlap of the selected key-point sentences."""
+    a, b = {p["text"] for p in reference_points}, {p["text"] for p in points}
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+def main():
+    parser = argparse.ArgumentParser(description=f"Compare {MODEL_NAME} embedding backends against the fp32 torch baseline")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--corpus", help="text file to embed (default: a synthetic transcript)")
+    parser.add_argument("--sentences", type=int, default=2000, help="synthetic transcript size")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="fail if a backend's mean cosine to fp32 is lower")
+    args = parser.parse_args()
+
+    text = load_corpus(args.corpus, args.sentences)
+    reference_model = load_sentence_model(MODEL_NAME, "torch")
+    reference_agent = KeyPointExtractionAgent(sentence_model=reference_model, backend="torch")
+    sentences = reference_agent.preprocess_text(text)
+    reference = np.asarray(reference_model.encode(sentences, batch_size=args.batch_size), dtype=np.float32)
+    reference_points = reference_agent.extract_key_points(text)
+    reference_agent.embedding_batcher.close()
+
+    print(f"{len(sentences)} sentences, batch size {args.batch_size}")
+    print(f"{'backend':<10} {'sent/s':>9} {'speedup':>8} {'mean cos':>9} {'min cos':>8} {'same NN':>8} {'key pts':>8}")
+    failures = []
+    base_rate = None
+    for backend in ["torch"] + [b for b in args.backends if b != "torch"]:
+        model = reference_model if backend == "torch" else load_sentence_model(MODEL_NAME, backend)
+        rate = throughput(model, sentences, args.batch_size, args.repeat)
+        base_rate = base_rate or rate
+        embeddings = np.asarray(model.encode(sentences, batch_size=args.batch_size), dtype=np.float32)
+        mean_cos, min_cos, same_nn = accuracy(reference, embeddings)
+        agent = KeyPointExtractionAgent(sentence_model=model, backend=backend)
+        overlap = key_point_overlap(reference_points, agent.extract_key_points(text))
+        agent.embedding_batcher.close()
+        print(f"{backend:<10} {rate:>9.1f} {rate / base_rate:>7.2f}x {mean_cos:>9.4f} {min_cos:>8.4f} {same_nn:>8.1%} {overlap:>8.1%}")
+        if mean_cos < args.min_cosine:
+            failures.append(backend)
+    if failures:
+        raise SystemExit(f"Mean cosine below {args.min_cosine} for: {', '.join(failures)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import argparse
+import time
+import tracemalloc
+
+from agents.key_point_extraction import KeyPointExtractionAgent, MODEL_NAME
+from benchmarks.fixtures import synthetic_transcript
+from benchmarks.stubs import StubSentenceModel
+
+def run(agent, transcript, threshold):
+    agent.large_input_threshold = threshold
+    agent.embedding_cache.clear()
+    tracemalloc.start()
+    start = time.perf_counter()
+    key_points = agent.extract_key_points(transcript)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, len(key_points)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark key-point extraction on synthetic transcripts")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--model", action="store_true", help=f"use the real {MODEL_NAME} model instead of the offline stub")
+    parser.add_argument("--max-full-kmeans", type=int, default=100000, help="skip full KMeans above this many sentences")
+    args = parser.parse_args()
+
+    sentence_model = None if args.model else StubSentenceModel()
+    agent = KeyPointExtractionAgent(sentence_model=sentence_model)
+    print(f"{'sentences':>10} {'mode':>10} {'seconds':>9} {'peak MB':>9} {'points':>7}")
+    for size in args.sizes:
+        transcript = synthetic_transcript(size)
+        modes = [("minibatch", 0)]
+        if size <= args.max_full_kmeans:
+            modes.insert(0, ("kmeans", size + 1))
+        for mode, threshold in modes:
+            elapsed, peak, points = run(agent, transcript, threshold)
+            print(f"{size:>10} {mode:>10} {elapsed:>9.2f} {peak / 1e6:>9.1f} {points:>7}")
+    agent.embedding_batcher.close()
+
+if __name__ == "__main__":
+    main()
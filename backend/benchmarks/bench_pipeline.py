@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import resource
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.fixtures import synthetic_transcript, synthetic_speech, write_wav, write_pdf
+from benchmarks.stubs import StubSentenceModel, StubWhisperModel, use_mongo_stand_in
+
+# Input sizes per tier: seconds of audio, PDF pages, transcript sentences
+SIZES = {
+    "small": {"audio": 60, "pdf": 5, "transcript": 200},
+    "medium": {"audio": 600, "pdf": 50, "transcript": 2000},
+    "large": {"audio": 3600, "pdf": 300, "transcript": 20000},
+}
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+def measure(fn, repeat):
+    """Median seconds over `repeat` runs, then the peak traced Python/NumPy allocation of one
+    more run. Tracing slows Python-heavy code several-fold, so it stays off while timing. A
+    first, untimed run absorbs one-off costs (imports, pool start-up, cold caches)."""
+    fn()
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": statistics.median(times), "peak_mb": peak / 1e6}, result
+
+async def ameasure(fn, repeat):
+    await fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        await fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": statistics.median(times), "peak_mb": peak / 1e6}
+
+def bench_stages(size, workdir, args, results):
+    from agents.audio_to_text import load_audio, split_audio, transcribe_chunk
+    from agents.pdf_to_text import extract_pdf_pages
+    from agents.brd_author import BRDAuthorAgent, render_pdf
+    spec = SIZES[size]
+    have_ffmpeg = shutil.which("ffmpeg") is not None
+
+    wav_path = write_wav(os.path.join(workdir, f"{size}.wav"), synthetic_speech(spec["audio"]))
+    if have_ffmpeg:
+        results[f"audio_decode/{size}"], audio = measure(lambda: load_audio(wav_path), args.repeat)
+    else:
+        audio = synthetic_speech(spec["audio"])
+    results[f"audio_split/{size}"], bounds = measure(lambda: split_audio(audio, args.chunk_seconds), args.repeat)
+    results[f"transcribe/{size}"], _ = measure(
+        lambda: [transcribe_chunk(args.whisper_model, audio[start:end]) for start, end in bounds], args.repeat
+    )
+
+    pdf_path = write_pdf(os.path.join(workdir, f"{size}.pdf"), spec["pdf"])
+    results[f"pdf_extract/{size}"], _ = measure(lambda: extract_pdf_pages(pdf_path, 0, spec["pdf"]), args.repeat)
+
+    transcript = synthetic_transcript(spec["transcript"])
+    agent = args.keypoint_agent
+
+    def key_points():
+        agent.embedding_cache.clear()
+        return agent.extract_key_points(transcript)
+    results[f"key_points/{size}"], points = measure(key_points, args.repeat)
+
+    brd_agent = BRDAuthorAgent(pdf_cache_dir=workdir)
+    texts = [point["text"] for point in points]
+    results[f"brd_generate/{size}"], content = measure(lambda: brd_agent.generate_brd(texts), args.repeat)
+    results[f"brd_pdf/{size}"], _ = measure(lambda: render_pdf(content, os.path.join(workdir, f"{size}-brd.pdf")), args.repeat)
+    return wav_path if have_ffmpeg else None, pdf_path
+
+async def bench_pipeline(inputs, args, results):
+    """process_file end to end: stage pools, chunked storage and the (stand-in) database."""
+    from agents.reasoning_planning import ReasoningPlanningAgent
+    from agents.worker_pool import stage_pool
+    reasoning_agent = ReasoningPlanningAgent()
+    reasoning_agent.keypoint_agent = args.keypoint_agent
+    reasoning_agent.audio_agent.model_size = args.whisper_model
+    await reasoning_agent.kb_agent.run(reasoning_agent.prepare)
+    try:
+        for size, (wav_path, pdf_path) in inputs.items():
+            for kind, path, content_type in (("audio", wav_path, "audio/wav"), ("pdf", pdf_path, "application/pdf")):
+                if path is None:
+                    print(f"skipping pipeline_{kind}/{size}: ffmpeg not found")
+                    continue
+
+                async def run_once():
+                    file_id = str(datetime.datetime.now().timestamp())
+                    await reasoning_agent.kb_agent.store_file({
+                        "id": file_id, "file_path": path, "status": "uploaded",
+                        "upload_time": datetime.datetime.now(), "error": None
+                    })
+                    reasoning_agent.keypoint_agent.embedding_cache.clear()
+                    await reasoning_agent.process_file(file_id, path, content_type)
+                    await reasoning_agent.kb_agent.flush()
+                results[f"pipeline_{kind}/{size}"] = await ameasure(run_once, args.repeat)
+    finally:
+        reasoning_agent.keypoint_agent.embedding_batcher.close()
+        stage_pool.shutdown()
+
+def compare(results, baseline, tolerance, min_delta_seconds=0.0):
+    """Print each measurement against the baseline; return the keys that got slower than
+    tolerance. Slowdowns under min_delta_seconds are timer noise on tiny benchmarks and never count."""
+    regressions = []
+    print(f"{'benchmark':<24} {'seconds':>9} {'baseline':>9} {'change':>8} {'peak MB':>9}")
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base and base["seconds"] > 0:
+            change = result["seconds"] / base["seconds"] - 1
+            slower = change > tolerance and result["seconds"] - base["seconds"] >= min_delta_seconds
+            flag = " <-- slower" if slower else ""
+            if flag:
+                regressions.append(key)
+            print(f"{key:<24} {result['seconds']:>9.3f} {base['seconds']:>9.3f} {change:>+8.1%} {result['peak_mb']:>9.1f}{flag}")
+        else:
+            print(f"{key:<24} {result['seconds']:>9.3f} {'-':>9} {'-':>8} {result['peak_mb']:>9.1f}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark each pipeline stage and the full pipeline on synthetic inputs")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small", "medium"])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark; the median time is reported")
+    parser.add_argument("--models", action="store_true", help="use the real SentenceTransformer and Whisper models instead of offline stubs")
+    parser.add_argument("--whisper-model", default="base")
+    parser.add_argument("--whisper-realtime-factor", type=float, default=0.0, help="stub Whisper sleeps this many seconds per second of audio")
+    parser.add_argument("--chunk-seconds", type=float, default=300)
+    parser.add_argument("--skip-pipeline", action="store_true")
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "latest.json"))
+    parser.add_argument("--baseline", default=os.path.join(RESULTS_DIR, "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="slowdown beyond which a benchmark counts as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="slowdowns smaller than this many milliseconds are never regressions")
+    args = parser.parse_args()
+
+    use_mongo_stand_in()
+    from agents.key_point_extraction import KeyPointExtractionAgent
+    from agents.model_registry import whisper_registry
+    args.keypoint_agent = KeyPointExtractionAgent(sentence_model=None if args.models else StubSentenceModel())
+    if not args.models:
+        whisper_registry.register(args.whisper_model, StubWhisperModel(args.whisper_realtime_factor))
+
+    results = {}
+    inputs = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            inputs[size] = bench_stages(size, workdir, args, results)
+        if not args.skip_pipeline:
+            asyncio.run(bench_pipeline(inputs, args, results))
+    # Whole-process high-water mark (Linux reports KB); tracemalloc above misses native model memory
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms / 1000)
+    print(f"max RSS {max_rss_mb:.0f} MB")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    report = {"created": datetime.datetime.now().isoformat(), "models": args.models, "max_rss_mb": max_rss_mb, "results": results}
+    for path in [args.output] + ([args.baseline] if args.save_baseline else []):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+    if regressions:
+        raise SystemExit(f"{len(regressions)} benchmarks slower than baseline by more than {args.tolerance:.0%} and {args.min_delta_ms:g} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import datetime
+import json
+import time
+import numpy as np
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+from agents.embedding_codec import encode_embedding
+from responses import MongoJSONResponse
+
+class LegacyMongoJSONEncoder(json.JSONEncoder):
+    """The encoder server.py used before MongoJSONResponse, kept here as the baseline."""
+
+    def default(self, o):
+        if isinstance(o, ObjectId):
+            return str(o)
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+def legacy_render(doc):
+    return JSONResponse(content=json.loads(json.dumps(doc, cls=LegacyMongoJSONEncoder))).body
+
+def fast_render(doc):
+    return MongoJSONResponse(content=doc).body
+
+def key_points(rng, count, packed):
+    points = []
+    for i in range(count):
+        vector = rng.normal(size=384).astype(np.float32)
+        points.append({
+            "text": f"Key point {i} about configuring VPN access for contractors.",
+            "cluster_id": i,
+            "embedding": encode_embedding(vector) if packed else vector.tolist(),
+            "similar_points": ["A related sentence from the same cluster."] * 3,
+            "offset": i * 120,
+        })
+    return points
+
+def transcription_payload(num_chunks, packed, seed=0):
+    """A file document with its transcription, shaped like get_file's response for a long meeting."""
+    rng = np.random.default_rng(seed)
+    chunk_text = "We need the deployment checklist reviewed before the release window opens. " * 60
+    return {
+        "_id": ObjectId(),
+        "id": "1746709635.130266",
+        "status": "done",
+        "upload_time": datetime.datetime.now(),
+        "transcription": {
+            "_id": ObjectId(),
+            "id": "1746709700.120001",
+            "file_id": "1746709635.130266",
+            "status": "done",
+            "text": chunk_text * num_chunks,
+            "key_points": key_points(rng, 15, packed),
+            "chunks": [
+                {"index": i, "start": i * 300.0, "end": (i + 1) * 300.0, "text": chunk_text, "key_points": key_points(rng, 10, packed)}
+                for i in range(num_chunks)
+            ],
+            "timestamp": datetime.datetime.now(),
+        },
+    }
+
+def timed(render, doc, repeat):
+    render(doc)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        body = render(doc)
+    return (time.perf_counter() - start) / repeat, len(body)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare response serialization on transcription payloads")
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1, 12, 48])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    print(f"{'chunks':>7} {'legacy ms':>10} {'fast ms':>9} {'speedup':>8} {'body KB':>8}")
+    for num_chunks in args.chunks:
+        # The legacy encoder cannot handle packed binary, so it gets the old float-list layout
+        legacy_ms, _ = timed(legacy_render, transcription_payload(num_chunks, packed=False), args.repeat)
+        fast_ms, size = timed(fast_render, transcription_payload(num_chunks, packed=True), args.repeat)
+        print(f"{num_chunks:>7} {legacy_ms * 1000:>10.2f} {fast_ms * 1000:>9.2f} {legacy_ms / fast_ms:>7.1f}x {size / 1024:>8.0f}")
+
+if __name__ == "__main__":
+    main()
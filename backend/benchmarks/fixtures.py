@@ -0,0 +1,65 @@
+import wave
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+TOPICS = ["security", "access", "setup", "configuration", "billing", "reporting", "onboarding", "support"]
+WORDS = ["the", "system", "must", "allow", "users", "to", "configure", "their", "vpn", "credentials",
+         "before", "deployment", "and", "review", "each", "request", "within", "two", "business", "days"]
+
+def synthetic_transcript(num_sentences, seed=0):
+    rng = np.random.default_rng(seed)
+    sentences = []
+    for i in range(num_sentences):
+        words = rng.choice(WORDS, size=rng.integers(6, 18))
+        sentences.append(f"{TOPICS[rng.integers(len(TOPICS))].title()} {' '.join(words)} item {i}.")
+    # Paragraph breaks every few sentences, like a diarized meeting transcript
+    paragraphs = [" ".join(sentences[i:i + 5]) for i in range(0, len(sentences), 5)]
+    return "\n\n".join(paragraphs)
+
+def synthetic_speech(seconds, seed=0):
+    """Speech-like 16kHz mono float32: voiced syllables (a wavering pitch with harmonics under a
+    syllable envelope) grouped into phrases separated by pauses, so silence-based chunking and
+    any voice-activity logic see realistic structure."""
+    rng = np.random.default_rng(seed)
+    audio = np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+    pos = 0
+    while pos < len(audio):
+        for _ in range(rng.integers(4, 20)):  # syllables in a phrase
+            length = int(rng.uniform(0.12, 0.3) * SAMPLE_RATE)
+            if pos + length > len(audio):
+                break
+            t = np.arange(length) / SAMPLE_RATE
+            pitch = rng.uniform(90, 220) * (1 + 0.05 * np.sin(2 * np.pi * 3 * t))
+            phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+            voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+            envelope = np.sin(np.pi * np.arange(length) / length) ** 2
+            audio[pos:pos + length] = 0.3 * envelope * voiced
+            pos += length + int(rng.uniform(0.02, 0.08) * SAMPLE_RATE)
+        pos += int(rng.uniform(0.4, 1.5) * SAMPLE_RATE)  # pause between phrases
+    audio += rng.normal(scale=0.003, size=len(audio)).astype(np.float32)  # room noise
+    return np.clip(audio, -1, 1)
+
+def write_wav(path, audio):
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes((audio * 32767).astype("<i2").tobytes())
+    return path
+
+def write_pdf(path, num_pages, seed=0):
+    """A text PDF of num_pages pages of transcript-like paragraphs."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+    c = canvas.Canvas(path, pagesize=letter)
+    lines = synthetic_transcript(num_pages * 40, seed=seed).replace("\n\n", " ").split(". ")
+    for page in range(num_pages):
+        y = 750
+        c.setFont("Helvetica", 10)
+        for line in lines[page * 40:(page + 1) * 40]:
+            c.drawString(54, y, line[:110] + ".")
+            y -= 17
+        c.showPage()
+    c.save()
+    return path
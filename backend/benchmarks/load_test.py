@@ -0,0 +1,359 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from benchmarks.fixtures import synthetic_speech, synthetic_transcript, write_pdf, write_wav
+from benchmarks.stub_smtp import StubSMTPServer
+
+# Relative weights of each action. "production" approximates how the UI drives the API: it polls
+# file status while uploads process, and reads far outnumber writes. For the measured mix, use
+# --mix-from-metrics against a production /metrics endpoint.
+SCENARIOS = {
+    "production": {"poll_file": 45, "list_tickets": 20, "get_brd": 8, "similar_brds": 8, "create_ticket": 6,
+                   "upload_pdf": 4, "create_brd": 4, "download_pdf": 3, "feedback": 1, "upload_audio": 1},
+    "uploads": {"upload_pdf": 40, "upload_audio": 10, "poll_file": 50},
+    "reads": {"poll_file": 40, "list_tickets": 30, "get_brd": 15, "similar_brds": 15},
+    "brds": {"create_brd": 40, "get_brd": 20, "download_pdf": 20, "create_ticket": 20},
+}
+
+# (method, route template) as labelled in http_request_seconds -> action
+ROUTE_ACTIONS = {
+    ("POST", "/api/agents/upload"): "upload",
+    ("GET", "/api/agents/files/{file_id}"): "poll_file",
+    ("POST", "/api/agents/brds"): "create_brd",
+    ("GET", "/api/agents/brds/{brd_id}"): "get_brd",
+    ("GET", "/api/agents/brds/{brd_id}/pdf"): "download_pdf",
+    ("POST", "/api/agents/tickets"): "create_ticket",
+    ("GET", "/api/agents/tickets"): "list_tickets",
+    ("POST", "/api/agents/similar_brds"): "similar_brds",
+    ("POST", "/api/agents/feedback"): "feedback",
+}
+
+def mix_from_metrics(text, audio_share):
+    """Request counts per route from Prometheus text output (GET /metrics) as action weights."""
+    mix = {}
+    pattern = re.compile(r'^http_request_seconds_count\{(.*)\}\s+([0-9.e+]+)$')
+    for line in text.splitlines():
+        match = pattern.match(line)
+        if not match:
+            continue
+        labels = dict(re.findall(r'(\w+)="([^"]*)"', match.group(1)))
+        action = ROUTE_ACTIONS.get((labels.get("method"), labels.get("route")))
+        if action:
+            mix[action] = mix.get(action, 0) + float(match.group(2))
+    uploads = mix.pop("upload", 0)
+    if uploads:
+        mix["upload_pdf"] = uploads * (1 - audio_share)
+        mix["upload_audio"] = uploads * audio_share
+    return {action: weight for action, weight in mix.items() if weight > 0}
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+class Recorder:
+    """Latencies per action, kept whole for the final report and per interval for the live one."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+        self._window = []
+
+    def record(self, action, seconds, ok):
+        with self._lock:
+            self.samples.setdefault(action, []).append(seconds)
+            if not ok:
+                self.errors[action] = self.errors.get(action, 0) + 1
+            self._window.append(seconds)
+
+    def take_window(self):
+        with self._lock:
+            window, self._window = self._window, []
+        return sorted(window)
+
+    def summary(self, elapsed):
+        rows = {}
+        with self._lock:
+            for action, values in self.samples.items():
+                values = sorted(values)
+                rows[action] = {
+                    "requests": len(values),
+                    "rps": len(values) / elapsed,
+                    "errors": self.errors.get(action, 0),
+                    "p50_ms": percentile(values, 50) * 1000,
+                    "p95_ms": percentile(values, 95) * 1000,
+                    "p99_ms": percentile(values, 99) * 1000,
+                }
+        return rows
+
+class Client:
+    """One keep-alive connection per virtual user, like a browser tab."""
+
+    def __init__(self, base_url, timeout=60):
+        parts = urlsplit(base_url)
+        self.host, self.port, self.timeout = parts.hostname, parts.port or 80, timeout
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, body=body, headers=headers or {})
+                response = self.conn.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+    def json(self, method, path, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else None
+        status, data = self.request(method, path, body, {"Content-Type": "application/json"} if body else None)
+        return status, json.loads(data) if data else None
+
+    def upload(self, path, content_type):
+        boundary = uuid.uuid4().hex
+        with open(path, "rb") as f:
+            content = f.read()
+        body = (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{os.path.basename(path)}\"\r\n"
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+        status, data = self.request("POST", "/api/agents/upload", body, {"Content-Type": f"multipart/form-data; boundary={boundary}"})
+        return status, json.loads(data)
+
+class SharedState:
+    """Ids created during the run, so reads hit documents that exist, as in production."""
+
+    def __init__(self, fixtures):
+        self.fixtures = fixtures
+        self.lock = threading.Lock()
+        self.files = []       # file ids
+        self.ready = []       # (file_id, [key point texts]) for processed files
+        self.ready_ids = set()
+        self.brds = []
+
+    def pick(self, name):
+        with self.lock:
+            items = getattr(self, name)
+            return random.choice(items) if items else None
+
+    def add(self, name, item):
+        with self.lock:
+            getattr(self, name).append(item)
+
+    def mark_ready(self, file_id, texts):
+        with self.lock:
+            if file_id not in self.ready_ids:
+                self.ready_ids.add(file_id)
+                self.ready.append((file_id, texts))
+
+def is_error(status, payload):
+    return status >= 400 or (isinstance(payload, dict) and "error" in payload)
+
+def run_action(action, client, state):
+    """Perform one action; returns (ok, skipped)."""
+    if action in ("upload_pdf", "upload_audio"):
+        # Fresh bytes each time: identical content would short-circuit through deduplication
+        path, content_type = state.fixtures[action]
+        with open(path, "ab") as f:
+            f.write(b" " if action == "upload_pdf" else b"\0\0")
+        status, payload = client.upload(path, content_type)
+        if not is_error(status, payload):
+            state.add("files", payload["file_id"])
+        return not is_error(status, payload), False
+    if action == "poll_file":
+        file_id = state.pick("files")
+        if file_id is None:
+            return True, True
+        status, payload = client.json("GET", f"/api/agents/files/{file_id}")
+        transcription = (payload or {}).get("transcription") or {}
+        if transcription.get("status") == "done" and transcription.get("key_points"):
+            state.mark_ready(file_id, [kp["text"] for kp in transcription["key_points"]])
+        return not is_error(status, payload), False
+    if action == "create_brd":
+        ready = state.pick("ready")
+        if ready is None:
+            return True, True
+        file_id, texts = ready
+        status, payload = client.json("POST", "/api/agents/brds", {"file_id": file_id, "selected_key_points": texts[:8]})
+        if not is_error(status, payload):
+            state.add("brds", payload["brd_id"])
+        return not is_error(status, payload), False
+    if action == "similar_brds":
+        ready = state.pick("ready")
+        texts = ready[1][:5] if ready else synthetic_transcript(5).split(". ")
+        status, payload = client.json("POST", "/api/agents/similar_brds?limit=10", {"selected_key_points": texts})
+        return not is_error(status, payload), False
+    if action == "list_tickets":
+        brd_id = state.pick("brds")
+        path = f"/api/agents/tickets?limit=50&brd_id={brd_id}" if brd_id and random.random() < 0.5 else "/api/agents/tickets?limit=50"
+        status, payload = client.json("GET", path)
+        return not is_error(status, payload), False
+    brd_id = state.pick("brds")
+    if brd_id is None:
+        return True, True
+    if action == "get_brd":
+        status, payload = client.json("GET", f"/api/agents/brds/{brd_id}")
+    elif action == "download_pdf":
+        status, data = client.request("GET", f"/api/agents/brds/{brd_id}/pdf")
+        payload = None if data.startswith(b"%PDF") else json.loads(data)
+    elif action == "create_ticket":
+        status, payload = client.json("POST", "/api/agents/tickets", {
+            "brd_id": brd_id, "title": "Configure VPN access", "description": "Set up contractor VPN profiles.", "type": "task"
+        })
+    elif action == "feedback":
+        status, payload = client.json("POST", "/api/agents/feedback", {"brd_id": brd_id, "rating": random.randint(1, 5), "comments": "Looks good"})
+    else:
+        raise ValueError(f"Unknown action '{action}'")
+    return not is_error(status, payload), False
+
+def virtual_user(base_url, mix, state, recorder, stop, think_seconds):
+    client = Client(base_url)
+    actions, weights = zip(*mix.items())
+    while not stop.is_set():
+        action = random.choices(actions, weights)[0]
+        start = time.perf_counter()
+        try:
+            ok, skipped = run_action(action, client, state)
+        except Exception:
+            ok, skipped = False, False
+        if not skipped:
+            recorder.record(action, time.perf_counter() - start, ok)
+        if think_seconds:
+            stop.wait(random.expovariate(1 / think_seconds))
+
+def rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+def start_stand_in(port, smtp_port, models):
+    env = dict(os.environ, SMTP_SERVER="127.0.0.1", SMTP_PORT=str(smtp_port), SMTP_STARTTLS="false", EMAIL_PASS="",
+               EMAIL_USER=os.getenv("EMAIL_USER", "load@example.com"), EMAIL_TO=os.getenv("EMAIL_TO", "ops@example.com"),
+               EMAIL_POLL_SECONDS="1")
+    cmd = [sys.executable, "-m", "benchmarks.serve_stand_in", "--port", str(port)] + (["--models"] if models else [])
+    process = subprocess.Popen(cmd, env=env)
+    client = Client(f"http://127.0.0.1:{port}")
+    for _ in range(120):
+        try:
+            if client.request("GET", "/health/ready")[0] == 200:
+                return process
+        except OSError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise SystemExit("Stand-in server did not become ready")
+
+def run_step(base_url, users, seconds, mix, state, pid, args, rss_series, started):
+    recorder = Recorder()
+    stop = threading.Event()
+    threads = [threading.Thread(target=virtual_user, args=(base_url, mix, state, recorder, stop, args.think), daemon=True)
+               for _ in range(users)]
+    for thread in threads:
+        thread.start()
+    step_start = time.time()
+    while time.time() - step_start < seconds:
+        time.sleep(max(0, min(args.report_interval, seconds - (time.time() - step_start))))
+        window = recorder.take_window()
+        rss = rss_mb(pid) if pid else None
+        rss_series.append({"t": round(time.time() - started, 1), "users": users, "rss_mb": rss})
+        print(f"[{time.time() - started:7.0f}s] users={users:<4} rps={len(window) / args.report_interval:7.1f} "
+              f"p95={percentile(window, 95) * 1000:8.1f}ms" + (f" rss={rss:.0f}MB" if rss else ""), flush=True)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return recorder.summary(time.time() - step_start)
+
+def print_summary(users, rows):
+    print(f"\n{users} users")
+    print(f"{'action':<14} {'requests':>9} {'rps':>7} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for action, row in sorted(rows.items()):
+        print(f"{action:<14} {row['requests']:>9} {row['rps']:>7.1f} {row['errors']:>7} "
+              f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load and soak test the API with a realistic request mix")
+    parser.add_argument("--url", help="test a running server instead of starting the stand-in (Mongo stand-in, stub models and SMTP)")
+    parser.add_argument("--pid", type=int, help="server process to sample RSS from when using --url")
+    parser.add_argument("--scenario", choices=list(SCENARIOS), default="production")
+    parser.add_argument("--mix", help="JSON file of {action: weight}; overrides --scenario")
+    parser.add_argument("--mix-from-metrics", help="URL or saved copy of a production /metrics page; replays its per-route request mix")
+    parser.add_argument("--audio-share", type=float, default=0.2, help="fraction of uploads that are audio with --mix-from-metrics")
+    parser.add_argument("--users", type=int, nargs="+", default=[10],
+                        help="concurrent virtual users; several values run as steps to find where latency collapses")
+    parser.add_argument("--step-seconds", type=float, default=60, help="duration of each --users step (use hours for a soak test)")
+    parser.add_argument("--think", type=float, default=0.5, help="mean pause between a user's requests, in seconds")
+    parser.add_argument("--report-interval", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--models", action="store_true", help="stand-in server loads the real models")
+    parser.add_argument("--output", help="write the summary and RSS series as JSON")
+    args = parser.parse_args()
+
+    mix = SCENARIOS[args.scenario]
+    if args.mix:
+        with open(args.mix) as f:
+            mix = json.load(f)
+    elif args.mix_from_metrics:
+        if args.mix_from_metrics.startswith("http"):
+            parts = urlsplit(args.mix_from_metrics)
+            status, data = Client(f"{parts.scheme}://{parts.netloc}").request("GET", parts.path or "/metrics")
+            text = data.decode()
+        else:
+            with open(args.mix_from_metrics) as f:
+                text = f.read()
+        mix = mix_from_metrics(text, args.audio_share)
+        if not mix:
+            raise SystemExit("No API requests found in the metrics")
+        print("Request mix: " + ", ".join(f"{action} {weight / sum(mix.values()):.1%}" for action, weight in sorted(mix.items())))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        fixtures = {
+            "upload_pdf": (write_pdf(os.path.join(workdir, "load.pdf"), 3), "application/pdf"),
+            "upload_audio": (write_wav(os.path.join(workdir, "load.wav"), synthetic_speech(30)), "audio/wav"),
+        }
+        state = SharedState(fixtures)
+        smtp, process = None, None
+        base_url, pid = args.url, args.pid
+        if not base_url:
+            smtp = StubSMTPServer().start()
+            process = start_stand_in(args.port, smtp.port, args.models)
+            base_url, pid = f"http://127.0.0.1:{args.port}", process.pid
+        started = time.time()
+        rss_series, steps = [], {}
+        try:
+            for users in args.users:
+                steps[users] = run_step(base_url, users, args.step_seconds, mix, state, pid, args, rss_series, started)
+                print_summary(users, steps[users])
+        finally:
+            if process:
+                process.terminate()
+                process.wait()
+            if smtp:
+                print(f"\nstub SMTP received {smtp.messages} emails")
+                smtp.stop()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"scenario": args.mix or args.mix_from_metrics or args.scenario, "mix": mix, "steps": steps, "rss": rss_series}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
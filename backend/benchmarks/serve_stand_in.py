@@ -0,0 +1,25 @@
+import argparse
+
+from benchmarks.stubs import StubSentenceModel, StubWhisperModel, use_mongo_stand_in
+
+def main():
+    parser = argparse.ArgumentParser(description="Run server.py against an in-memory Mongo stand-in and stub models")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--models", action="store_true", help="load the real SentenceTransformer and Whisper models")
+    parser.add_argument("--whisper-realtime-factor", type=float, default=0.05,
+                        help="stub Whisper sleeps this many seconds per second of audio")
+    args = parser.parse_args()
+
+    use_mongo_stand_in()
+    import uvicorn
+    import server
+    from agents.key_point_extraction import KeyPointExtractionAgent
+    from agents.model_registry import whisper_registry
+    if not args.models:
+        server.reasoning_agent.keypoint_agent = KeyPointExtractionAgent(sentence_model=StubSentenceModel())
+        whisper_registry.register(server.reasoning_agent.audio_agent.model_size, StubWhisperModel(args.whisper_realtime_factor))
+    uvicorn.run(server.app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import time
+import os
+import numpy as np
+
+from benchmarks.fixtures import TOPICS, WORDS, SAMPLE_RATE
+
+class StubSentenceModel:
+    """Offline stand-in for SentenceTransformer: topic-clustered random 384-d vectors."""
+
+    def __init__(self, dim=384, seed=42):
+        self.rng = np.random.default_rng(seed)
+        self.centers = self.rng.normal(size=(len(TOPICS), dim)).astype(np.float32)
+
+    def encode(self, texts, batch_size=32):
+        topics = [TOPICS.index(text.split()[0].lower()) if text.split()[0].lower() in TOPICS else 0 for text in texts]
+        noise = self.rng.normal(scale=0.6, size=(len(texts), self.centers.shape[1])).astype(np.float32)
+        return self.centers[topics] + noise
+
+class StubWhisperModel:
+    """Offline stand-in for a Whisper model: about 2.5 words per second of audio, and
+    optionally a fixed real-time factor so pipeline timings keep their shape."""
+
+    def __init__(self, realtime_factor=0.0, seed=0):
+        self.realtime_factor = realtime_factor
+        self.rng = np.random.default_rng(seed)
+
+    def transcribe(self, audio, **kwargs):
+        seconds = len(audio) / SAMPLE_RATE
+        if self.realtime_factor:
+            time.sleep(seconds * self.realtime_factor)
+        sentences = []
+        for _ in range(max(1, int(seconds / 5))):
+            words = self.rng.choice(WORDS, size=12)
+            sentences.append(f"{TOPICS[self.rng.integers(len(TOPICS))].title()} {' '.join(words)}.")
+        return {"text": " ".join(sentences), "language": "en"}
+
+def use_mongo_stand_in():
+    """Point agents.database at an in-memory mongomock client. Must run before any agent
+    touches the database."""
+    try:
+        import mongomock
+    except ImportError:
+        raise SystemExit("The Mongo stand-in needs mongomock: pip install -r benchmarks/requirements.txt")
+    from agents import database
+    # mongomock is not safe for concurrent use, so give it a single driver thread
+    os.environ["MONGO_EXECUTOR_THREADS"] = "1"
+    database._client = mongomock.MongoClient()
+    return database._client
@@ -0,0 +1,41 @@
+import logging
+import signal
+import sys
+import os
+import argparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from agents.inference import InferenceServer, inference_address, parse_address
+from agents.model_registry import whisper_registry
+
+logging.basicConfig(
+    filename="inference.log",
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    # One per host: API and job workers started with the same INFERENCE_SERVER_ADDRESS share its models
+    parser = argparse.ArgumentParser(description="Serve embedding and transcription models to local workers")
+    parser.add_argument("--address", type=parse_address, default=None,
+                        help="Unix socket path or loopback host:port (default: INFERENCE_SERVER_ADDRESS)")
+    parser.add_argument("--warm", action="store_true", help="load the embedding and Whisper models before serving")
+    args = parser.parse_args()
+    address = args.address or inference_address()
+    if address is None:
+        parser.error("set INFERENCE_SERVER_ADDRESS or pass --address")
+    server = InferenceServer(address)
+    if args.warm:
+        server.keypoint_agent.load_model()
+        whisper_registry.get(os.getenv("WHISPER_MODEL", "base"))
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        logger.info("Inference server stopped")
@@ -0,0 +1,77 @@
+import argparse
+import logging
+from pymongo import UpdateOne
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from agents.database import get_database
+from agents.embedding_codec import encode_embedding, storage_dtype
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+def pack_key_points(key_points, dtype):
+    for key_point in key_points or []:
+        if isinstance(key_point.get("embedding"), list):
+            key_point["embedding"] = encode_embedding(key_point["embedding"], dtype)
+    return key_points
+
+def convert_brd(doc, dtype):
+    return {"embedding": encode_embedding(doc["embedding"], dtype)}
+
+def convert_transcription(doc, dtype):
+    update = {"key_points": pack_key_points(doc.get("key_points"), dtype)}
+    if doc.get("chunks"):
+        for chunk in doc["chunks"]:
+            pack_key_points(chunk.get("key_points"), dtype)
+        update["chunks"] = doc["chunks"]
+    return update
+
+def convert_cache_entry(doc, dtype):
+    return {"embedding": encode_embedding(doc["embedding"], dtype)}
+
+# collection -> (query matching documents that still hold float arrays, fields to read, converter)
+MIGRATIONS = {
+    "brds": ({"embedding": {"$type": "double"}}, {"embedding": 1}, convert_brd),
+    "transcriptions": (
+        {"$or": [{"key_points.embedding": {"$type": "double"}}, {"chunks.key_points.embedding": {"$type": "double"}}]},
+        {"key_points": 1, "chunks": 1},
+        convert_transcription,
+    ),
+    "embedding_cache": ({"embedding": {"$type": "double"}}, {"embedding": 1}, convert_cache_entry),
+}
+
+def migrate(db, name, dtype, batch_size, dry_run):
+    query, projection, convert = MIGRATIONS[name]
+    collection = db[name]
+    total = collection.count_documents(query)
+    logger.info(f"{name}: {total} documents with float-array embeddings")
+    if dry_run or not total:
+        return total
+    batch, converted = [], 0
+    for doc in collection.find(query, projection).batch_size(batch_size):
+        batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": convert(doc, dtype)}))
+        if len(batch) >= batch_size:
+            collection.bulk_write(batch, ordered=False)
+            converted += len(batch)
+            batch = []
+            logger.info(f"{name}: converted {converted}/{total}")
+    if batch:
+        collection.bulk_write(batch, ordered=False)
+        converted += len(batch)
+    logger.info(f"{name}: converted {converted} documents")
+    return converted
+
+if __name__ == "__main__":
+    # Converts embeddings stored as BSON double arrays to packed binary; safe to re-run
+    parser = argparse.ArgumentParser(description="Convert stored embeddings to packed binary")
+    parser.add_argument("--dtype", choices=["float32", "float16"], default=None, help="default: EMBEDDING_STORAGE_DTYPE")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--collections", nargs="+", choices=list(MIGRATIONS), default=list(MIGRATIONS))
+    parser.add_argument("--dry-run", action="store_true", help="only count documents that need converting")
+    args = parser.parse_args()
+    dtype = args.dtype or storage_dtype()
+    db = get_database()
+    for name in args.collections:
+        migrate(db, name, dtype, args.batch_size, args.dry_run)
@@ -0,0 +1,37 @@
+from fastapi.responses import StreamingResponse
+from bson import ObjectId
+from bson.errors import InvalidId
+from responses import MongoJSONResponse, dumps
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def page_size(limit):
+    return min(max(1, limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE)
+
+def parse_object_id(cursor):
+    """Decode a keyset cursor (the last _id of the previous page); raises ValueError if malformed."""
+    if cursor is None:
+        return None
+    try:
+        return ObjectId(cursor)
+    except (InvalidId, TypeError):
+        raise ValueError(f"Invalid cursor '{cursor}'")
+
+def parse_offset(cursor):
+    if cursor is None:
+        return 0
+    if not cursor.isdigit():
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    return int(cursor)
+
+def page_response(items, next_cursor):
+    """JSON array of one page; the cursor for the next page, if any, is in X-Next-Cursor."""
+    response = MongoJSONResponse(content=items)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return response
+
+def ndjson_response(documents):
+    """Stream documents from an iterator (e.g. a Mongo cursor) one JSON line at a time."""
+    return StreamingResponse((dumps(doc) + b"\n" for doc in documents), media_type="application/x-ndjson")
@@ -0,0 +1,26 @@
+from fastapi.responses import JSONResponse
+from bson import ObjectId
+from bson.binary import Binary
+import numpy as np
+import orjson
+from agents.embedding_codec import decode_embedding
+
+def mongo_default(o):
+    """orjson fallback for the BSON types found in our documents."""
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, (Binary, bytes)):
+        return decode_embedding(o).astype(np.float32)
+    if isinstance(o, np.generic):
+        return o.item()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+def dumps(content):
+    return orjson.dumps(content, default=mongo_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+class MongoJSONResponse(JSONResponse):
+    """Serializes Mongo documents (ObjectId, datetime, NumPy arrays, packed embeddings)
+    straight to bytes in one pass."""
+
+    def render(self, content):
+        return dumps(content)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional, Union
 import datetime
 
 class FileSchema(BaseModel):
@@ -8,11 +8,19 @@ class FileSchema(BaseModel):
     status: str
     upload_time: datetime.datetime
     error: Optional[str] = None
+    stage_seconds: Optional[Dict[str, float]] = None  # per-stage durations of the latest attempt
+    processing_seconds: Optional[float] = None
+    # Audio only: the Whisper model and language chosen by preprocessing, and what trimming/tiering saved
+    whisper_model: Optional[str] = None
+    language: Optional[str] = None
+    audio_seconds: Optional[float] = None
+    speech_seconds: Optional[float] = None
+    estimated_seconds_saved: Optional[float] = None
 
 class KeyPointSchema(BaseModel):
     text: str
     cluster_id: int
-    embedding: List[float]
+    embedding: Union[bytes, List[float]]  # packed float32/float16, see agents/embedding_codec.py
 
 class TranscriptionSchema(BaseModel):
     id: str
@@ -27,7 +35,8 @@ class BRDSchema(BaseModel):
     selected_key_points: List[str]
     content: str
     pdf_path: str
-    embedding: List[float]
+    embedding: Union[bytes, List[float]]
+    created: Optional[datetime.datetime] = None  # the BRD index syncs incrementally on this
 
 class TicketSchema(BaseModel):
     id: str
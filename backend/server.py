@@ -1,29 +1,28 @@
-import shutil
 import logging
 import asyncio
 import datetime
-from fastapi import FastAPI, File, UploadFile, BackgroundTasks
+from fastapi import FastAPI, File, UploadFile, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
-from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, Response
 from pydantic import BaseModel
-import PyPDF2
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import Optional
 import os
 import traceback
-from bson import ObjectId
-import json
+import hashlib
+import tempfile
+import time
 
 # Import agents
-from agents.audio_to_text import AudioToTextAgent
-from agents.key_point_extraction import KeyPointExtractionAgent
-from agents.knowledge_base import KnowledgeBaseAgent
-from agents.brd_author import BRDAuthorAgent
-from agents.task_management import TaskManagementAgent
-from agents.quality_check import QualityCheckAgent
-from agents.communication import CommunicationAgent
-from agents.feedback import FeedbackAgent
+from agents.reasoning_planning import ReasoningPlanningAgent
+from agents.knowledge_base import TRANSCRIPTION_PROJECTION
+from agents.brd_author import content_hash
+from agents.embedding_codec import encode_embedding
+from agents.worker_pool import stage_pool
+from agents import metrics
+
+from responses import MongoJSONResponse
+from pagination import page_size, parse_object_id, parse_offset, page_response, ndjson_response
 
 # Import schema
 from schema import CreateBRDRequest, CreateTicketRequest, SimilarBRDsRequest, FeedbackRequest
@@ -47,176 +46,249 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template, not the raw path, so ids don't create one series per document
+    route = request.scope.get("route")
+    metrics.HTTP_REQUEST_SECONDS.labels(
+        request.method, route.path if route else "unmatched", str(response.status_code)
+    ).observe(time.perf_counter() - start)
+    return response
+
 # Directories
 os.makedirs("data/uploads", exist_ok=True)
 os.makedirs("data/brds", exist_ok=True)
 
-# In-memory queue for agent coordination
-task_queue = asyncio.Queue()
-
-class MongoJSONEncoder(json.JSONEncoder):
-    def default(self, o):
-        if isinstance(o, ObjectId):
-            return str(o)
-        if isinstance(o, datetime.datetime):
-            return o.isoformat()
-        return super().default(o)
-
-def mongo_serializer(obj):
-    """Custom serializer for MongoDB objects"""
-    if isinstance(obj, ObjectId):
-        return str(obj)
-    if isinstance(obj, datetime.datetime):
-        return obj.isoformat()
-    return obj
-
-class ReasoningPlanningAgent:
-    def __init__(self):
-        self.audio_agent = AudioToTextAgent()
-        self.keypoint_agent = KeyPointExtractionAgent()
-        self.kb_agent = KnowledgeBaseAgent()
-        self.brd_agent = BRDAuthorAgent()
-        self.task_agent = TaskManagementAgent()
-        self.quality_agent = QualityCheckAgent()
-        self.comm_agent = CommunicationAgent()
-        self.feedback_agent = FeedbackAgent()
-        self.logger = logging.getLogger(__name__)
-
-    async def process_file(self, file_id, file_path, content_type):
+# Initialize the reasoning agent; cheap, since Mongo setup and model loads happen after startup
+reasoning_agent = ReasoningPlanningAgent()
+
+# Job workers embedded in the API process; set JOB_EMBEDDED_WORKERS=0 when running worker.py separately
+embedded_workers = []
+email_senders = []
+
+# Render BRD PDFs right after creation instead of on first download
+BRD_PDF_EAGER = os.getenv("BRD_PDF_EAGER", "false").lower() == "true"
+render_tasks = set()
+
+# Capabilities /health/ready waits for; the rest are reported but don't gate traffic
+READINESS_REQUIRES = [c.strip() for c in os.getenv("READINESS_REQUIRES", "database").split(",") if c.strip()]
+background_tasks = {}
+
+async def prepare_database():
+    # Retry until Mongo is reachable rather than failing the deploy
+    retry_seconds = float(os.getenv("STARTUP_RETRY_SECONDS", "5"))
+    while True:
         try:
-            self.logger.info(f"Processing file {file_id}")
-            self.kb_agent.update_file(file_id, {"status": "transcribing"})
-            if content_type.startswith("video/") or content_type.startswith("audio/"):
-                transcription = await self.audio_agent.transcribe(file_path)
-            elif content_type == "application/pdf":
-                with open(file_path, 'rb') as f:
-                    reader = PyPDF2.PdfReader(f)
-                    transcription = " ".join(page.extract_text() for page in reader.pages)
-            else:
-                raise ValueError("Unsupported file type")
-            if not transcription:
-                raise Exception("Transcription failed")
-            transcription_id = str(datetime.datetime.now().timestamp())
-            key_points = self.keypoint_agent.extract_key_points(transcription)
-            transcription_data = {
-                "id": transcription_id,
-                "file_id": file_id,
-                "text": transcription,
-                "key_points": key_points,
-                "timestamp": datetime.datetime.now()
-            }
-            self.kb_agent.store_transcription(transcription_data)
-            self.kb_agent.update_file(file_id, {"status": "done"})
-            await self.comm_agent.send_email("Transcription Completed", f"File {file_id} processed.")
-            self.logger.info(f"File {file_id} processed successfully")
+            await reasoning_agent.kb_agent.run(reasoning_agent.prepare)
+            break
         except Exception as e:
-            self.logger.error(f"File {file_id} processing failed: {str(e)}")
-            self.kb_agent.update_file(file_id, {"status": "error", "error": str(e)})
-            await self.comm_agent.send_email("Processing Failed", f"File {file_id} failed: {str(e)}")
-
-    async def suggest_brd(self, key_points):
-        embeddings = [kp["embedding"] for kp in key_points]
-        avg_embedding = np.mean(embeddings, axis=0)
-        brds = list(self.kb_agent.brds_col.find())
-        for brd in brds:
-            brd_embedding = np.mean([self.keypoint_agent.sentence_model.encode(p) for p in brd["selected_key_points"]], axis=0)
-            similarity = cosine_similarity([avg_embedding], [brd_embedding])[0][0]
-            if similarity > 0.85:
-                self.logger.info(f"Suggested BRD {brd['id']} with similarity {similarity}")
-                return True, brd["id"]
-        return False, None
-
-# Initialize the reasoning agent
-reasoning_agent = ReasoningPlanningAgent()
+            logger.error(f"Database preparation failed, retrying in {retry_seconds}s: {str(e)}")
+            await asyncio.sleep(retry_seconds)
+    concurrency = int(os.getenv("JOB_EMBEDDED_WORKERS", "1"))
+    if concurrency > 0:
+        worker = reasoning_agent.create_worker(concurrency=concurrency)
+        embedded_workers.append((worker, asyncio.create_task(worker.run())))
+    sender = reasoning_agent.create_email_sender()
+    email_senders.append((sender, asyncio.create_task(sender.run())))
+
+def start_warmup():
+    task = background_tasks.get("warmup")
+    if task is None or task.done():
+        task = asyncio.create_task(asyncio.to_thread(reasoning_agent.warm_models))
+        background_tasks["warmup"] = task
+    return task
+
+@app.on_event("startup")
+async def start_background():
+    # Startup hooks run before uvicorn accepts connections, so only schedule work here
+    background_tasks["database"] = asyncio.create_task(prepare_database())
+    if os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true":
+        start_warmup()
+
+@app.on_event("shutdown")
+async def stop_workers():
+    background_tasks["database"].cancel()
+    for worker, task in embedded_workers + email_senders:
+        worker.stop()
+        await task
+    await reasoning_agent.kb_agent.flush()
+    stage_pool.shutdown(wait=False)
+
+async def save_upload(file):
+    """Stream an upload to disk while hashing it; the file is stored under its SHA-256."""
+    hasher = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir="data/uploads", suffix=".part", delete=False) as f:
+        temp_path = f.name
+        while chunk := await file.read(1024 * 1024):
+            hasher.update(chunk)
+            f.write(chunk)
+    content_hash = hasher.hexdigest()
+    extension = os.path.splitext(file.filename or "")[1].lower()
+    file_path = f"data/uploads/{content_hash}{extension}"
+    if os.path.exists(file_path):
+        os.remove(temp_path)
+    else:
+        os.replace(temp_path, file_path)
+    return file_path, content_hash
 
 @app.post("/api/agents/upload")
-async def upload_file(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+async def upload_file(file: UploadFile = File(...), priority: int = 0):
     if file.size > 100 * 1024 * 1024:
         logger.error("File size exceeds 100MB")
         return {"error": "File size exceeds 100MB"}
-    file_path = f"data/uploads/{file.filename}"
-    with open(file_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+    file_path, content_hash = await save_upload(file)
     file_id = str(datetime.datetime.now().timestamp())
     file_data = {
         "id": file_id,
         "file_path": file_path,
+        "filename": file.filename,
+        "content_hash": content_hash,
         "status": "uploading",
         "upload_time": datetime.datetime.now(),
         "error": None
     }
-    reasoning_agent.kb_agent.store_file(file_data)
-    background_tasks.add_task(reasoning_agent.process_file, file_id, file_path, file.content_type)
+    await reasoning_agent.kb_agent.store_file(file_data)
+    if await reasoning_agent.link_duplicate(file_id, content_hash):
+        logger.info(f"File {file_id} uploaded, reusing transcription of identical content")
+        return {"file_id": file_id, "duplicate": True}
+    await reasoning_agent.enqueue_file(file_id, file_path, file.content_type, priority=priority)
     logger.info(f"File {file_id} uploaded")
     return {"file_id": file_id}
 
 @app.get("/api/agents/files/{file_id}")
-def get_file(file_id: str):
+async def get_file(file_id: str, include_transcription: Optional[bool] = None):
     try:
-        file_data = reasoning_agent.kb_agent.get_file(file_id)
+        file_data = await reasoning_agent.kb_agent.get_file(file_id)
         if file_data:
-            # Convert MongoDB objects to serializable format
-            file_data = json.loads(json.dumps(file_data, cls=MongoJSONEncoder))
-            if file_data["status"] == "done":
-                transcription = reasoning_agent.kb_agent.transcriptions_col.find_one({"file_id": file_id})
-                if transcription:
-                    transcription = json.loads(json.dumps(transcription, cls=MongoJSONEncoder))
-                    file_data["transcription"] = transcription
+            # By default status polls get only the small file document until the file is done;
+            # include_transcription=true returns the partial transcription, chunk by chunk, earlier
+            done = file_data.get("status") == "done"
+            if include_transcription is None:
+                include_transcription = done
+            transcription = None
+            if include_transcription:
+                # Once done, the full text already holds every chunk's text
+                projection = {**TRANSCRIPTION_PROJECTION, "chunks.text": 0} if done else TRANSCRIPTION_PROJECTION
+                transcription = await reasoning_agent.kb_agent.get_transcription(file_id, projection)
+            if transcription:
+                file_data["transcription"] = transcription
             logger.info(f"Retrieved file {file_id} with status {file_data['status']}")
-            return JSONResponse(content=file_data)
+            return MongoJSONResponse(content=file_data)
         logger.error(f"File {file_id} not found")
         return JSONResponse(content={"error": "File not found"})
     except Exception as e:
         logger.error(f"Error retrieving file {file_id}: {str(e)}\n{traceback.format_exc()}")
         return JSONResponse(content={"error": f"Internal server error: {str(e)}"})
 
+@app.get("/api/agents/files/{file_id}/key_points")
+async def get_key_points(file_id: str, k: int = 10):
+    """Top-k key points cut from the file's stored cluster tree; any k is served without re-clustering."""
+    try:
+        tree = await reasoning_agent.get_cluster_tree(file_id)
+        if tree is None:
+            return JSONResponse(content={"error": "No clustered transcription for this file"})
+        return JSONResponse(content={"file_id": file_id, "clusters": tree.num_leaves, "key_points": tree.top_k(k)})
+    except Exception as e:
+        logger.error(f"Error retrieving key points for file {file_id}: {str(e)}\n{traceback.format_exc()}")
+        return JSONResponse(content={"error": f"Internal server error: {str(e)}"})
+
+@app.get("/api/agents/files/{file_id}/key_points/clusters/{cluster_id}")
+async def get_key_point_cluster(file_id: str, cluster_id: int, limit: Optional[int] = None, cursor: Optional[str] = None):
+    """Drill into a key point's cluster: its two sub-clusters, or for a leaf a page of its sentences."""
+    try:
+        offset = parse_offset(cursor)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)})
+    try:
+        tree = await reasoning_agent.get_cluster_tree(file_id)
+        if tree is None:
+            return JSONResponse(content={"error": "No clustered transcription for this file"})
+        limit = page_size(limit)
+        try:
+            node = tree.node(cluster_id, offset=offset, limit=limit)
+        except ValueError as e:
+            return JSONResponse(content={"error": str(e)})
+        response = JSONResponse(content=node)
+        if offset + limit < node.get("total_sentences", 0):
+            response.headers["X-Next-Cursor"] = str(offset + limit)
+        return response
+    except Exception as e:
+        logger.error(f"Error retrieving cluster {cluster_id} for file {file_id}: {str(e)}\n{traceback.format_exc()}")
+        return JSONResponse(content={"error": f"Internal server error: {str(e)}"})
+
 @app.post("/api/agents/brds")
 async def create_brd(request: CreateBRDRequest):
     valid, error = reasoning_agent.quality_agent.validate_brd(request.selected_key_points)
     if not valid:
         logger.error(f"BRD creation failed: {error}")
         return {"error": error}
-    transcription = reasoning_agent.kb_agent.transcriptions_col.find_one({"file_id": request.file_id})
+    transcription = await reasoning_agent.kb_agent.get_transcription(request.file_id, {"id": 1})
     if not transcription:
         logger.error("Transcription not found")
         return {"error": "Transcription not found"}
     content = reasoning_agent.brd_agent.generate_brd(request.selected_key_points)
     brd_id = str(datetime.datetime.now().timestamp())
-    pdf_path = f"data/brds/{brd_id}.pdf"
-    reasoning_agent.brd_agent.generate_pdf(content, pdf_path)
-    embeddings = reasoning_agent.keypoint_agent.sentence_model.encode(request.selected_key_points)
+    # The PDF is rendered off the request path: on first download, or in the background with BRD_PDF_EAGER=true
+    digest = content_hash(content)
+    pdf_path = reasoning_agent.brd_agent.pdf_path(digest)
+    if BRD_PDF_EAGER:
+        task = asyncio.create_task(render_brd_pdf(brd_id, content, digest))
+        render_tasks.add(task)
+        task.add_done_callback(render_tasks.discard)
+    embeddings = await stage_pool.run("embedding", reasoning_agent.keypoint_agent.encode, request.selected_key_points)
+    embedding = np.mean(embeddings, axis=0)
     brd_data = {
         "id": brd_id,
         "transcription_id": transcription["id"],
         "selected_key_points": request.selected_key_points,
         "content": content,
+        "content_hash": digest,
         "pdf_path": pdf_path,
-        "embedding": np.mean(embeddings, axis=0).tolist()
+        "embedding": encode_embedding(embedding),
+        "created": datetime.datetime.now()
     }
-    reasoning_agent.kb_agent.store_brd(brd_data)
+    await reasoning_agent.kb_agent.store_brd(brd_data)
+    reasoning_agent.brd_index.add(brd_id, embedding)
     await reasoning_agent.comm_agent.send_email("BRD Created", f"BRD {brd_id} created. Download: /api/agents/brds/{brd_id}/pdf")
     logger.info(f"BRD {brd_id} created")
     return {"brd_id": brd_id, "content": content, "pdf_path": pdf_path}
 
 @app.get("/api/agents/brds/{brd_id}")
-def get_brd(brd_id: str):
-    brd = reasoning_agent.kb_agent.brds_col.find_one({"id": brd_id})
+async def get_brd(brd_id: str):
+    brd = await reasoning_agent.kb_agent.get_brd(brd_id)
     if not brd:
         logger.error(f"BRD {brd_id} not found")
         return JSONResponse(content={"error": "BRD not found"})
     logger.info(f"Retrieved BRD {brd_id}")
-    return JSONResponse(content=json.loads(json.dumps(brd, cls=MongoJSONEncoder)))
+    return MongoJSONResponse(content=brd)
+
+async def render_brd_pdf(brd_id, content, digest):
+    try:
+        await reasoning_agent.brd_agent.render_pdf(content, digest)
+    except Exception as e:
+        logger.error(f"Background PDF render for BRD {brd_id} failed: {str(e)}")
 
 @app.get("/api/agents/brds/{brd_id}/pdf")
-def get_brd_pdf(brd_id: str):
-    brd = reasoning_agent.kb_agent.brds_col.find_one({"id": brd_id})
-    if not brd or not os.path.exists(brd["pdf_path"]):
+async def get_brd_pdf(brd_id: str):
+    brd = await reasoning_agent.kb_agent.get_brd(brd_id, {"pdf_path": 1, "content": 1, "content_hash": 1})
+    if not brd:
         logger.error(f"PDF for BRD {brd_id} not found")
         return {"error": "PDF not found"}
+    pdf_path = brd.get("pdf_path")
+    # BRDs created before the render cache have their own PDF; everything else is rendered on demand
+    if not pdf_path or not os.path.exists(pdf_path):
+        try:
+            pdf_path = await reasoning_agent.brd_agent.render_pdf(brd["content"], brd.get("content_hash"))
+        except Exception as e:
+            logger.error(f"Rendering PDF for BRD {brd_id} failed: {str(e)}\n{traceback.format_exc()}")
+            return {"error": "PDF not found"}
     logger.info(f"Serving PDF for BRD {brd_id}")
-    return FileResponse(brd["pdf_path"], media_type="application/pdf", filename=f"brd_{brd_id}.pdf")
+    return FileResponse(pdf_path, media_type="application/pdf", filename=f"brd_{brd_id}.pdf")
 
 @app.post("/api/agents/tickets")
 async def create_ticket(request: CreateTicketRequest):
@@ -227,40 +299,92 @@ async def create_ticket(request: CreateTicketRequest):
     if not valid:
         logger.error(f"Ticket creation failed: {error}")
         return {"error": error}
-    reasoning_agent.kb_agent.store_ticket(ticket_data)
+    await reasoning_agent.kb_agent.store_ticket(ticket_data)
     await reasoning_agent.comm_agent.send_email("Ticket Created", f"Ticket {ticket_data['id']} created.")
     logger.info(f"Ticket {ticket_data['id']} created")
     return {"ticket_id": ticket_data["id"]}
 
 @app.get("/api/agents/tickets")
-def get_tickets():
+async def get_tickets(limit: Optional[int] = None, after: Optional[str] = None, brd_id: Optional[str] = None,
+                      status: Optional[str] = None, format: str = "json"):
+    try:
+        cursor = parse_object_id(after)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)})
+    filters = {field: value for field, value in {"brd_id": brd_id, "status": status}.items() if value is not None}
     try:
-        tickets = list(reasoning_agent.kb_agent.tickets_col.find())
-        return JSONResponse(content=json.loads(json.dumps(tickets, cls=MongoJSONEncoder)))
+        if format == "ndjson":
+            return ndjson_response(reasoning_agent.kb_agent.iter_tickets(filters, cursor, limit))
+        limit = page_size(limit)
+        tickets = await reasoning_agent.kb_agent.get_tickets(filters, cursor, limit)
+        return page_response(tickets, tickets[-1]["_id"] if len(tickets) == limit else None)
     except Exception as e:
         logger.error(f"Error retrieving tickets: {str(e)}")
         return JSONResponse(content={"error": f"Internal server error: {str(e)}"})
 
 @app.post("/api/agents/similar_brds")
-def get_similar_brds(request: SimilarBRDsRequest):
+async def get_similar_brds(request: SimilarBRDsRequest, limit: int = 10, cursor: Optional[str] = None,
+                           transcription_id: Optional[str] = None, min_score: Optional[float] = None, format: str = "json"):
     try:
-        similar_brds = list(reasoning_agent.kb_agent.brds_col.find())
-        return JSONResponse(content=json.loads(json.dumps(similar_brds, cls=MongoJSONEncoder)))
+        offset = parse_offset(cursor)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)})
+    filters = {"transcription_id": transcription_id} if transcription_id else {}
+    try:
+        if not request.selected_key_points:
+            return JSONResponse(content=[])
+        if format == "ndjson":
+            matches = await reasoning_agent.rank_brds(request.selected_key_points, min_score=min_score)
+            return ndjson_response(reasoning_agent.kb_agent.iter_ranked_brds(matches[offset:], filters))
+        limit = page_size(limit)
+        # Pages are ranges of the ranking; filtered-out BRDs leave a page short rather than shifting later pages
+        similar_brds, has_more = await reasoning_agent.find_similar_brds(
+            request.selected_key_points, k=limit, offset=offset, filters=filters, min_score=min_score
+        )
+        return page_response(similar_brds, offset + limit if has_more else None)
     except Exception as e:
         logger.error(f"Error retrieving similar BRDs: {str(e)}")
         return JSONResponse(content={"error": f"Internal server error: {str(e)}"})
 
 @app.post("/api/agents/feedback")
 async def submit_feedback(request: FeedbackRequest):
-    feedback_data = reasoning_agent.feedback_agent.store_feedback(
+    feedback_data = await reasoning_agent.feedback_agent.store_feedback(
         request.brd_id, request.rating, request.comments
     )
-    await reasoning_agent.communication_agent.send_email(
+    await reasoning_agent.comm_agent.send_email(
         "Feedback Received", f"Feedback for BRD {request.brd_id}: Rating {request.rating}"
     )
     logger.info(f"Feedback {feedback_data['id']} submitted")
     return {"feedback_id": feedback_data["id"]}
 
+@app.get("/health/live")
+async def liveness():
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness(require: Optional[str] = None):
+    """503 until every required capability (READINESS_REQUIRES, or ?require=a,b) is ready."""
+    capabilities = reasoning_agent.capabilities()
+    required = [c.strip() for c in require.split(",") if c.strip()] if require else READINESS_REQUIRES
+    ready = all(capabilities.get(capability) is True for capability in required)
+    return JSONResponse(
+        content={"ready": ready, "required": required, "capabilities": capabilities},
+        status_code=200 if ready else 503
+    )
+
+@app.post("/health/warmup")
+async def warmup(wait: bool = False):
+    task = start_warmup()
+    if wait:
+        await task
+    return {"capabilities": reasoning_agent.capabilities()}
+
+@app.get("/metrics")
+async def get_metrics():
+    await reasoning_agent.kb_agent.run(metrics.update_runtime_gauges, reasoning_agent)
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,59 @@
+import asyncio
+import numpy as np
+import pytest
+
+from agents import audio_to_text
+from agents.audio_preprocessing import SAMPLE_RATE, voice_segments
+from agents.audio_to_text import AudioToTextAgent, load_speech
+from agents.job_queue import PermanentJobError
+
+def tone(seconds, amplitude, frequency=220.0):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+def noise(seconds, amplitude, seed=0):
+    return (amplitude * np.random.default_rng(seed).standard_normal(int(seconds * SAMPLE_RATE))).astype(np.float32)
+
+def speech_in_noise():
+    """Two 3s bursts of 'speech' over a quiet noise floor, 20s in all."""
+    audio = noise(20, 0.001)
+    for start in (4, 12):
+        audio[start * SAMPLE_RATE:(start + 3) * SAMPLE_RATE] += tone(3, 0.3)
+    return audio
+
+@pytest.fixture
+def decoded(monkeypatch):
+    """Stands in for ffmpeg: load_audio returns whatever array the test sets."""
+    audio = {}
+    monkeypatch.setattr(audio_to_text, "load_audio", lambda file_path: audio["samples"])
+    return audio
+
+def plan(file_path="meeting.wav"):
+    agent = AudioToTextAgent(model_size="base", chunk_seconds=30)
+    # A fixed language keeps Whisper out of planning
+    agent.language = "en"
+    return asyncio.run(agent.plan_chunks(file_path))
+
+def test_silence_between_speech_is_trimmed(decoded):
+    decoded["samples"] = speech_in_noise()
+    audio, segments, original_samples = load_speech("meeting.wav")
+    assert len(segments) == 2
+    assert 6 * SAMPLE_RATE <= len(audio) < 8 * SAMPLE_RATE
+    assert original_samples == 20 * SAMPLE_RATE
+    assert plan().bounds
+
+@pytest.mark.parametrize("samples", [tone(20, 0.3), noise(20, 0.2), np.zeros(20 * SAMPLE_RATE, np.float32)],
+                         ids=["constant tone", "noise", "silence"])
+def test_steady_audio_is_kept_whole(decoded, samples):
+    decoded["samples"] = samples
+    assert voice_segments(samples) == [(0, len(samples))]
+    audio, segments, _ = load_speech("meeting.wav")
+    assert len(audio) == len(samples)
+    result = plan()
+    assert result.bounds and result.bounds[-1][1] == len(samples)
+
+def test_empty_audio_fails_without_retrying(decoded):
+    decoded["samples"] = np.zeros(0, np.float32)
+    assert voice_segments(decoded["samples"]) == []
+    with pytest.raises(PermanentJobError, match="No speech detected"):
+        plan()
@@ -0,0 +1,32 @@
+import numpy as np
+
+from agents.embedding_batcher import EmbeddingBatcher
+from agents.embedding_cache import EmbeddingCache
+
+def fake_encoder(texts):
+    return np.array([[len(text), 1.0, 0.0] for text in texts], dtype=np.float32)
+
+def test_empty_input_gives_an_empty_matrix():
+    cache = EmbeddingCache(fake_encoder, "fake", dim=3)
+    result = cache.encode([])
+    assert result.shape == (0, 3) and result.dtype == np.float32
+
+def test_empty_input_width_is_learned_from_earlier_results():
+    cache = EmbeddingCache(fake_encoder, "fake")
+    cache.encode(["hello"])
+    assert cache.encode([]).shape == (0, 3)
+
+def test_repeated_texts_are_encoded_once():
+    calls = []
+    cache = EmbeddingCache(lambda texts: calls.append(list(texts)) or fake_encoder(texts), "fake")
+    result = cache.encode(["a", "bb", "a"])
+    assert result.shape == (3, 3)
+    assert calls == [["a", "bb"]]
+    cache.encode(["bb"])
+    assert len(calls) == 1
+
+def test_batcher_empty_submission_matches_the_cache():
+    batcher = EmbeddingBatcher(fake_encoder, dim=3)
+    assert batcher.encode([]).shape == (0, 3)
+    assert batcher.encode(["abc"]).shape == (1, 3)
+    batcher.close()
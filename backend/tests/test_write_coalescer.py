@@ -0,0 +1,146 @@
+import asyncio
+import pytest
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from agents.database import WriteCoalescer
+
+class FakeCollection:
+    """Just enough of a pymongo collection for WriteCoalescer: an ordered bulk_write over a
+    dict of documents with a unique `id`, supporting InsertOne and $set/$push updates."""
+
+    def __init__(self, name="items"):
+        self.name = name
+        self.docs = {}
+        self.bulk_writes = []
+        self.fail_with = None
+
+    def bulk_write(self, requests, ordered=True):
+        self.bulk_writes.append(len(requests))
+        if self.fail_with is not None:
+            raise self.fail_with
+        for index, request in enumerate(requests):
+            if isinstance(request, InsertOne):
+                doc = request._doc
+                if doc["id"] in self.docs:
+                    raise BulkWriteError({
+                        "writeErrors": [{"index": index, "code": 11000, "errmsg": f"duplicate id {doc['id']}"}],
+                        "nInserted": index,
+                    })
+                self.docs[doc["id"]] = dict(doc)
+                continue
+            doc = self.docs.get(request._filter["id"])
+            if doc is None:
+                continue
+            for field, value in request._doc.get("$set", {}).items():
+                doc[field] = value
+            for field, value in request._doc.get("$push", {}).items():
+                doc.setdefault(field, []).append(value)
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_sets_to_one_document_share_one_operation():
+    collection = FakeCollection()
+    coalescer = WriteCoalescer(window_ms=5)
+
+    async def scenario():
+        await coalescer.insert(collection, {"id": "a", "status": "new"})
+        await asyncio.gather(
+            coalescer.set_fields(collection, {"id": "a"}, {"status": "transcribing"}),
+            coalescer.set_fields(collection, {"id": "a"}, {"chunks_done": 1}),
+            coalescer.set_fields(collection, {"id": "a"}, {"status": "done"}),
+        )
+
+    run(scenario())
+    assert collection.docs["a"] == {"id": "a", "status": "done", "chunks_done": 1}
+    assert collection.bulk_writes == [1, 1]
+
+def test_writes_are_applied_in_order():
+    collection = FakeCollection()
+    coalescer = WriteCoalescer(window_ms=5)
+
+    async def scenario():
+        await asyncio.gather(
+            coalescer.insert(collection, {"id": "a"}),
+            coalescer.update(collection, {"id": "a"}, {"$push": {"chunks": 0}}),
+            coalescer.update(collection, {"id": "a"}, {"$push": {"chunks": 1}}),
+        )
+
+    run(scenario())
+    assert collection.docs["a"]["chunks"] == [0, 1]
+    assert collection.bulk_writes == [3]
+
+def test_failed_write_raises_only_for_its_caller():
+    collection = FakeCollection()
+    collection.docs["dup"] = {"id": "dup"}
+    coalescer = WriteCoalescer(window_ms=5)
+
+    async def scenario():
+        return await asyncio.gather(
+            coalescer.insert(collection, {"id": "before"}),
+            coalescer.insert(collection, {"id": "dup"}),
+            coalescer.insert(collection, {"id": "after"}),
+            return_exceptions=True,
+        )
+
+    before, dup, after = run(scenario())
+    assert before is None
+    assert isinstance(dup, DuplicateKeyError)
+    assert after is None
+    assert set(collection.docs) == {"dup", "before", "after"}
+    # The ops after the failing one were not executed by the first bulk write, so they were resent
+    assert collection.bulk_writes == [3, 1]
+
+def test_unknown_failure_fails_every_write():
+    collection = FakeCollection()
+    collection.fail_with = ConnectionError("connection reset")
+    coalescer = WriteCoalescer(window_ms=5)
+
+    async def scenario():
+        return await asyncio.gather(
+            coalescer.insert(collection, {"id": "a"}),
+            coalescer.set_fields(collection, {"id": "b"}, {"status": "done"}),
+            return_exceptions=True,
+        )
+
+    results = run(scenario())
+    assert all(isinstance(result, ConnectionError) for result in results)
+
+def test_full_batch_flushes_without_waiting_for_the_window():
+    collection = FakeCollection()
+    coalescer = WriteCoalescer(window_ms=60000, max_batch=2)
+
+    async def scenario():
+        await asyncio.wait_for(asyncio.gather(
+            coalescer.insert(collection, {"id": "a"}),
+            coalescer.insert(collection, {"id": "b"}),
+        ), timeout=5)
+
+    run(scenario())
+    assert set(collection.docs) == {"a", "b"}
+
+def test_collections_are_written_separately():
+    files, jobs = FakeCollection("files"), FakeCollection("jobs")
+    coalescer = WriteCoalescer(window_ms=5)
+
+    async def scenario():
+        await asyncio.gather(
+            coalescer.insert(files, {"id": "a"}),
+            coalescer.insert(jobs, {"id": "a"}),
+        )
+
+    run(scenario())
+    assert files.bulk_writes == [1] and jobs.bulk_writes == [1]
+    assert "a" in files.docs and "a" in jobs.docs
+
+@pytest.mark.parametrize("window_ms", [0, 5])
+def test_await_means_written(window_ms):
+    collection = FakeCollection()
+    coalescer = WriteCoalescer(window_ms=window_ms)
+
+    async def scenario():
+        await coalescer.insert(collection, {"id": "a"})
+        return dict(collection.docs)
+
+    assert "a" in run(scenario())
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import signal
+import argparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from agents.reasoning_planning import ReasoningPlanningAgent
+from agents.worker_pool import stage_pool
+from prometheus_client import start_http_server
+import os
+
+logging.basicConfig(
+    filename="worker.log",
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+def log_task_failure(task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task {task.get_name()} failed: {task.exception()}")
+
+async def main(concurrency):
+    reasoning_agent = ReasoningPlanningAgent()
+    # Stage timings from this process are only visible on its own endpoint, not the API's /metrics
+    metrics_port = int(os.getenv("WORKER_METRICS_PORT", "0"))
+    if metrics_port:
+        start_http_server(metrics_port)
+        logger.info(f"Serving worker metrics on port {metrics_port}")
+    await reasoning_agent.kb_agent.run(reasoning_agent.prepare)
+    # Held here so they are not garbage-collected mid-run; cancelled on shutdown
+    background_tasks = set()
+    if os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true":
+        warmup = asyncio.create_task(asyncio.to_thread(reasoning_agent.warm_models), name="warmup")
+        warmup.add_done_callback(log_task_failure)
+        background_tasks.add(warmup)
+    worker = reasoning_agent.create_worker(concurrency=concurrency)
+    sender = reasoning_agent.create_email_sender()
+    def stop():
+        worker.stop()
+        sender.stop()
+    loop = asyncio.get_running_loop()
+    # add_signal_handler replaces any earlier handler for the signal, so one handler stops both
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop)
+    try:
+        await asyncio.gather(worker.run(), sender.run())
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        await reasoning_agent.kb_agent.flush()
+        stage_pool.shutdown()
+
+if __name__ == "__main__":
+    # Standalone job worker; start as many as needed, on this host or others sharing the same MONGO_URI
+    parser = argparse.ArgumentParser(description="Drain the file-processing job queue")
+    parser.add_argument("--concurrency", type=int, default=None, help="jobs processed at once (default: JOB_WORKER_CONCURRENCY)")
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency))
@@ -45,8 +45,7 @@ const TicketManager: React.FC<TicketManagerProps> = ({ brdId }) => {
     try {
       setLoading(true);
       setError(null);
-      const response = await api.getTickets();
-      setTickets(brdId ? response.filter(t => t.brd_id === brdId) : response);
+      setTickets(await api.getTickets(brdId));
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Failed to load tickets');
     } finally {
@@ -90,9 +90,18 @@ const api = {
     return response.data;
   },
 
-  getTickets: async (): Promise<Ticket[]> => {
-    const response = await axios.get(`${API_BASE_URL}/agents/tickets`);
-    return response.data;
+  // The endpoint is paginated; follow X-Next-Cursor until every page is loaded
+  getTickets: async (brdId?: string): Promise<Ticket[]> => {
+    const tickets: Ticket[] = [];
+    let after: string | undefined;
+    do {
+      const response = await axios.get(`${API_BASE_URL}/agents/tickets`, {
+        params: { limit: 1000, after, brd_id: brdId },
+      });
+      tickets.push(...response.data);
+      after = response.headers['x-next-cursor'];
+    } while (after);
+    return tickets;
   },
 
   // Feedback operations